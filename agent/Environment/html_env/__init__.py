@@ -1,5 +1,16 @@
 from .utils import *
+from .node_store import *
+from .node_index import *
+from .html_parsers import *
 from .build_tree import *
+from .incremental_tree import *
+from .observation_cache import *
+from .observation_budget import *
+from .paged_observation import *
+from .observation_compression import *
+from .element_classifier import *
 from .active_elements import *
 from .actions import *
+from .browser_pool import *
+from .request_blocking import *
 from .async_env import *
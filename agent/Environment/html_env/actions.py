@@ -26,6 +26,7 @@ class ActionTypes(IntEnum):
     SCROLL_UP = 11
     CACHE_DATA = 12
     GET_FINAL_ANSWER = 13
+    EXPAND = 14
 
 @beartype
 def create_cache_data_action(elementid: int,fill_text: str) -> Action:
@@ -166,6 +167,16 @@ def create_scroll_up_action(elementid: int) -> Action:
         "element_name": ""
     }
 
+@beartype
+def create_expand_action(elementid: int) -> Action:
+    return {
+        "action_type": ActionTypes.EXPAND,
+        "element_id": elementid,
+        "url": "",
+        "fill_text": "",
+        "element_name": ""
+    }
+
 @beartype
 def create_action(elementid: int, action_type: str, action_input: str) -> Action:
     if action_type == "click":
@@ -192,6 +203,8 @@ def create_action(elementid: int, action_type: str, action_input: str) -> Action
         return create_cache_data_action(elementid=elementid,fill_text=action_input)
     elif action_type == "get_final_answer":
         return create_get_final_answer(elementid=elementid,fill_text=action_input)
+    elif action_type == "expand":
+        return create_expand_action(elementid=elementid)
     else:
         return create_none_action(elementid=elementid)
 
@@ -212,5 +225,6 @@ __all__ = [
     "create_scroll_up_action",
     "create_cache_data_action",
     "create_get_final_answer",
+    "create_expand_action",
     "create_action"
 ]
@@ -1,4 +1,5 @@
-from .utils import ElementNode, ConditionTagNameList, TypeList
+from .utils import ElementNode, TypeList
+from .element_classifier import DEFAULT_CLASSIFIER
 import re
 
 
@@ -21,10 +22,11 @@ class ActiveElements:
         return True
 
     @staticmethod
-    def is_interactive(element: ElementNode):
+    def is_interactive(element: ElementNode, tag: str = None):
+        """tag is the label of the element if it is already known"""
         if element is None:
             return False
-        tag = ActiveElements.get_element_tagName(element)
+        tag = tag or ActiveElements.get_element_tagName(element)
         if tag == 'input' and element["attributes"].get('type') == 'hidden':
             return False
         if tag in ['select', 'option'] and element["attributes"].get('disabled'):
@@ -35,63 +37,8 @@ class ActiveElements:
 
     @staticmethod
     def get_element_tagName(element: ElementNode) -> str:
-        tag_name = element["tagName"].lower()
-        if tag_name == 'input':
-            input_type = element["attributes"].get('type')
-            if input_type == 'checkbox':
-                return 'checkbox'
-            elif input_type == 'radio':
-                return 'radio'
-            elif input_type == 'button':
-                return 'button'
-            else:
-                return 'input'
-        elif tag_name == 'select':
-            return 'select'
-        elif tag_name == 'optgroup':
-            return 'optgroup'
-        elif tag_name == 'textarea':
-            return 'textarea'
-        elif tag_name == 'option':
-            return 'option'
-        elif tag_name == 'datalist':
-            return 'datalist'
-        # elif tag_name == 'label':
-        #     return 'label'
-        elif tag_name == 'button':
-            return 'button'
-        elif tag_name == 'a':
-            return 'link'
-        elif tag_name in ConditionTagNameList:
-            role = element["attributes"].get('role')
-            if not role:
-                return 'unknown'
-            elif role == 'button':
-                return 'button'
-            elif role == 'link':
-                return 'link'
-            elif role == 'menuitem':
-                return 'link'
-            elif role == 'textbox':
-                return 'input'
-            elif role == 'checkbox':
-                return 'checkbox'
-            elif role == 'radio':
-                return 'radio'
-            elif role == 'tab':
-                return 'link'
-            elif role == 'switch':
-                return 'switch'
-            elif role == 'option':
-                return 'option'
-            elif role == 'row':
-                return 'row'
-            elif role == 'search-box':
-                return 'search-box'
-            else:
-                return 'unknown'
-        else:
-            return 'unknown'
+        attributes = element["attributes"]
+        return DEFAULT_CLASSIFIER.label(element["tagName"], attributes.get('type'), attributes.get('role'))
 
     @staticmethod
     def is_valid_element(element: ElementNode) -> bool:
@@ -1,6 +1,6 @@
 import logging
 from json import JSONDecodeError
-from typing import Tuple, Any, Union
+from typing import Tuple, Any, Union, Optional
 
 from playwright.async_api import async_playwright, Page
 from playwright.async_api import Error as PlaywrightError
@@ -10,14 +10,22 @@ from beartype import beartype
 from difflib import SequenceMatcher
 from tenacity import AsyncRetrying, after_log, wait_exponential_jitter
 
-from PIL import Image
-from io import BytesIO
 import asyncio
-import base64
 import re
 
 from .actions import Action, ActionTypes
 from .build_tree import HTMLTree
+from .incremental_tree import IncrementalHTMLTree
+from .observation_cache import ObservationCache
+from .html_parsers import create_html_parser
+from .element_classifier import ElementClassifier, DEFAULT_CLASSIFIER
+from .browser_pool import BrowserPool
+from .request_blocking import RequestBlocker, VISUAL_MODES
+from .observation_budget import render_within_budget
+from .paged_observation import PagedObservation
+from .observation_compression import compress_elements
+from .dom_extraction import EXTRACT_CANDIDATES_JS, FRAME_XPATH_JS, MUTATION_TOKEN_JS, SNAPSHOT_COMPUTED_STYLES, \
+    SETTLE_JS, STAMP_HANDLES_JS, extraction_arguments, stamp_arguments
 from .utils import stringfy_value
 import time
 
@@ -38,6 +46,24 @@ class SelectorExecutionError(Exception):
     def __init__(self, message, selector=None):
         super().__init__(message)
 
+# lxml: serialize the page with page.content() and parse it with HTMLTree
+# js: extract candidate nodes in the page with EXTRACT_CANDIDATES_JS
+# cdp_snapshot: capture DOM, layout and computed styles with DOMSnapshot.captureSnapshot
+OBSERVATION_BACKENDS = ("lxml", "js", "cdp_snapshot")
+# record: write the network traffic of the context to har_path when it closes
+# replay: answer every request from har_path, requests it does not hold are aborted
+HAR_MODES = ("off", "record", "replay")
+# Screenshots of capture are encoded once by the browser, in one of these formats
+SCREENSHOT_FORMATS = ("jpeg", "webp", "png")
+SCREENSHOT_WIDTH = 1080
+# Seconds to wait for one child frame, a frame that takes longer is left out of the observation
+FRAME_TIMEOUT = 5
+# Adaptive settle: a page is settled once loaded, without DOM mutations for SETTLE_QUIET_MS
+# and with at most SETTLE_MAX_REQUESTS requests in flight
+SETTLE_QUIET_MS = 250
+SETTLE_MAX_REQUESTS = 2
+
+
 class AsyncHTMLEnvironment:
     @beartype
     def __init__(
@@ -51,10 +77,43 @@ class AsyncHTMLEnvironment:
         save_trace_enabled: bool = False,
         sleep_after_execution: float = 0.0,
         locale: str = "en-US",
-        use_vimium_effect=True
+        use_vimium_effect=True,
+        observation_backend: str = "lxml",
+        observation_cache_size: int = 16,
+        incremental_observation: bool = False,
+        paged_observation: bool = False,
+        compress_observation: bool = False,
+        html_parser: str = "lxml",
+        observe_frames: bool = False,
+        element_rules: str = "",
+        element_handles: bool = False,
+        browser_pool: Optional[BrowserPool] = None,
+        adaptive_settle: bool = False,
+        block_resources: Optional[bool] = None,
+        har_mode: str = "off",
+        har_path: str = "",
+        screenshot_format: str = "jpeg",
+        screenshot_quality: int = 90
     ):
+        if observation_backend not in OBSERVATION_BACKENDS:
+            raise ValueError(
+                f"observation_backend must be one of {OBSERVATION_BACKENDS}, got {observation_backend}")
+        if paged_observation and observation_backend != "cdp_snapshot":
+            raise ValueError("paged_observation needs the layout of the cdp_snapshot observation_backend")
+        if observe_frames and observation_backend == "cdp_snapshot":
+            raise ValueError("observe_frames needs the lxml or js observation_backend")
+        if har_mode not in HAR_MODES:
+            raise ValueError(f"har_mode must be one of {HAR_MODES}, got {har_mode}")
+        if har_mode != "off" and not har_path:
+            raise ValueError(f"har_mode {har_mode} needs a har_path")
+        if screenshot_format not in SCREENSHOT_FORMATS:
+            raise ValueError(f"screenshot_format must be one of {SCREENSHOT_FORMATS}, got {screenshot_format}")
         self.use_vimium_effect = use_vimium_effect
         self.mode = mode
+        # Token budget of the rendered accessibility tree, 0 renders it whole
+        self.max_page_length = max_page_length
+        self.last_observation_stats = {}
+        self.observation_backend = observation_backend
         self.headless = headless
         self.slow_mo = slow_mo
         self.current_viewport_only = current_viewport_only
@@ -62,10 +121,53 @@ class AsyncHTMLEnvironment:
         self.viewport_size = viewport_size
         self.save_trace_enabled = save_trace_enabled
         self.sleep_after_execution = sleep_after_execution
-        self.tree = HTMLTree()
+        # Labels elements of the observation, element_rules is a TOML file of site rules
+        self.classifier = ElementClassifier.from_file(element_rules) if element_rules else DEFAULT_CLASSIFIER
+        self.tree = self.new_tree(HTMLTree)
+        self.html_content = ""
+        # Trees built by the lxml backend, reused when the same html is seen again
+        self.observation_cache = ObservationCache(observation_cache_size)
+        # Parses the html of the lxml backend, see HTML_PARSER_BACKENDS
+        self.html_parser = create_html_parser(html_parser)
+        # Merge the documents of child frames into the observation, frames[n] is frame number n of the tree
+        self.observe_frames = observe_frames
+        self.frames = []
+        self.frame_contents = []
+        # Build each lxml observation from the previous one of the same page
+        self.incremental_observation = incremental_observation
+        self.tree_url = None
+        # Paged observations extract the whole page once and show one viewport of it
+        self.paged_observation = paged_observation
+        self.pages = None
+        self.pages_token = None
+        # Collapse repeated sibling patterns, the planner can expand them by group number
+        self.compress_observation = compress_observation
+        self.expanded_groups = set()
+        self.expanded_url = None
+        # Stamp elements with handles while observing, actions then locate elements by handle
+        self.element_handles = element_handles
+        # Take a warm browser from the pool instead of launching one, each task still gets its own context
+        self.browser_pool = browser_pool
+        self.pooled_browser = None
+        # Wait after actions until the page settles instead of for fixed times, which become upper bounds
+        self.adaptive_settle = adaptive_settle
+        self.inflight_requests = set()
+        self.settle_times = [0.0, 0]    # ms waited and ms of fixed waits since the last observation
+        # Abort images, media, fonts and trackers, by default in the modes without screenshots
+        if block_resources is None:
+            block_resources = mode not in VISUAL_MODES
+        self.request_blocker = RequestBlocker() if block_resources else None
+        self.har_mode = har_mode
+        self.har_path = har_path
+        # quality applies to jpeg and webp
+        self.screenshot_format = screenshot_format
+        self.screenshot_quality = screenshot_quality
         self.locale = locale
+        self.playwright = None
         self.context = None
         self.browser = None
+        self.cdp_session = None
+        self.cdp_page = None
         self.current_events = []  # Add event queue
         self.events_directory = os.path.join(os.path.dirname(__file__), '..', 'js_event')
         os.makedirs(self.events_directory, exist_ok=True)
@@ -74,11 +176,12 @@ class AsyncHTMLEnvironment:
         self.page = page
 
     async def setup(self, start_url: str) -> None:
-        self.playwright = await async_playwright().start()
+        browserbase_api_key = os.environ.get('BROWSERBASE_API_KEY')
+        if self.browser_pool is None or browserbase_api_key:
+            self.playwright = await async_playwright().start()
         
         try:
             # Try to connect to BrowserBase first
-            browserbase_api_key = os.environ.get('BROWSERBASE_API_KEY')
             if browserbase_api_key:
                 logger.info("Attempting to connect to BrowserBase Cloud Environment...")
                 browser_cdp_url = f"wss://connect.browserbase.com?apiKey={browserbase_api_key}"
@@ -92,6 +195,15 @@ class AsyncHTMLEnvironment:
                                         .connect_over_cdp(browser_cdp_url))
                 self.context = self.browser.contexts[0]  # Use the existing context from BrowserBase
                 logger.info("Successfully connected to BrowserBase")
+            elif self.browser_pool is not None:
+                await self.close_pooled_context()
+                self.pooled_browser = await self.browser_pool.acquire()
+                self.browser = self.pooled_browser.browser
+                self.context = await self.browser.new_context(
+                    viewport=self.viewport_size,
+                    locale=self.locale
+                )
+                logger.info("New context in a pooled browser")
             else:
                 # Fallback to local browser if no API key found
                 logger.info("No BrowserBase API key found, launching local browser...")
@@ -107,16 +219,27 @@ class AsyncHTMLEnvironment:
 
             # Set up page handler for both scenarios
             self.context.on("page", self.page_on_handler)
+            self.inflight_requests = set()
+            self.context.on("request", self.inflight_requests.add)
+            self.context.on("requestfinished", self.inflight_requests.discard)
+            self.context.on("requestfailed", self.inflight_requests.discard)
+            if self.har_mode != "off":
+                await self.context.route_from_har(self.har_path, not_found="abort",
+                                                  update=self.har_mode == "record")
+                logger.info(f"-- HAR {self.har_mode} of network traffic with {self.har_path}")
+            if self.request_blocker is not None:
+                # Routes added later run first, requests the blocker lets through fall back to the HAR
+                await self.request_blocker.install(self.context)
 
             if start_url:
                 # Use existing or create new page
                 self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
                 await self.page.goto(start_url, timeout=10000)
-                await self.page.wait_for_timeout(500)
-                self.html_content = await self.page.content()
+                await self.settle(500, "setup")
+                await self.refresh_html_content()
             else:
                 self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
-                self.html_content = await self.page.content()
+                await self.refresh_html_content()
 
             # JS event listener setup
             await self.context.expose_binding(
@@ -127,10 +250,14 @@ class AsyncHTMLEnvironment:
         except Exception as e:
             logger.error(f"Failed to setup browser environment: {str(e)}")
             # Cleanup in case of failure
-            if hasattr(self, 'browser') and self.browser:
+            if self.pooled_browser is not None:
+                await self.close_pooled_context()
+            elif hasattr(self, 'browser') and self.browser:
                 await self.browser.close()
             if hasattr(self, 'playwright') and self.playwright:
                 await self.playwright.stop()
+            # Nothing is left for close to release
+            self.context = None
             raise
 
     async def _event_listener(self):
@@ -253,16 +380,217 @@ class AsyncHTMLEnvironment:
         """Get the latest events"""
         return self.current_events[-count:] if self.current_events else []
 
-    async def get_obs(self) -> Union[str, Tuple[str, str]]:
-        observation = ""
-        observation_VforD = ""
+    async def refresh_html_content(self) -> None:
+        """Serialize the page for the lxml backend, other backends read the live DOM in update_tree"""
+        if self.observation_backend == "lxml":
+            if self.observe_frames:
+                self.html_content, self.frame_contents = await self.extract_frames(self.frame_content)
+            else:
+                self.html_content = await self.frame_content(self.page)
+
+    async def frame_content(self, frame) -> str:
+        """html of a frame or page, with element handles stamped in the same round trip"""
+        if self.element_handles:
+            return await frame.evaluate(STAMP_HANDLES_JS, stamp_arguments(True))
+        return await frame.content()
+
+    async def extract_frame(self, frame, extract) -> tuple:
+        """xpath of the iframe of a child frame and what extract returns for it,
+        or None when the frame is detached, fails or takes longer than FRAME_TIMEOUT"""
+        async def xpath_and_result():
+            iframe = await frame.frame_element()
+            return await asyncio.gather(iframe.evaluate(FRAME_XPATH_JS), extract(frame))
         try:
+            return await asyncio.wait_for(xpath_and_result(), FRAME_TIMEOUT)
+        except (PlaywrightError, asyncio.TimeoutError) as e:
+            logger.info(f"-- Left frame {frame.url} out of the observation: {e!r}")
+            return None
+
+    async def extract_frames(self, extract) -> tuple:
+        """Run extract on the main frame and every child frame concurrently.
+
+        Frames are numbered breadth-first from 0 for the main frame into
+        self.frames, so parents come before their children. Returns the result
+        for the main frame and (parent frame number, iframe xpath, result) for
+        each child frame, the result is None for frames that could not be read.
+        """
+        frames = [self.page.main_frame]
+        parent_numbers = []
+        index = 0
+        while index < len(frames):
+            for child in frames[index].child_frames:
+                if not child.is_detached():
+                    frames.append(child)
+                    parent_numbers.append(index)
+            index += 1
+        main_result, *frame_results = await asyncio.gather(
+            extract(frames[0]), *(self.extract_frame(frame, extract) for frame in frames[1:]))
+        self.frames = frames
+        frame_documents = []
+        for parent_number, frame_result in zip(parent_numbers, frame_results):
+            iframe_xpath, result = frame_result if frame_result is not None else ("", None)
+            frame_documents.append((parent_number, iframe_xpath, result))
+        return main_result, frame_documents
+
+    def element_frame(self, element_id: int):
+        """Frame whose document holds the element, the page itself for its own elements"""
+        frame_number = self.tree.get_frame(element_id)
+        if 0 < frame_number < len(self.frames) and not self.frames[frame_number].is_detached():
+            return self.frames[frame_number]
+        return self.page
+
+    def element_selector(self, element_id: int) -> str:
+        """Selector of the element in its frame, its handle when it has one"""
+        if self.element_handles:
+            selector = self.tree.get_handle_selector(element_id)
+            if selector:
+                return selector
+        return self.tree.get_selector(element_id)
+
+    async def cdp(self):
+        """CDP session of self.page, a new one when the page changed"""
+        if self.cdp_session is None or self.cdp_page is not self.page:
+            if self.cdp_session is not None:
+                try:
+                    await self.cdp_session.detach()
+                except Exception:
+                    pass
+            self.cdp_session = await self.context.new_cdp_session(self.page)
+            self.cdp_page = self.page
+        return self.cdp_session
+
+    async def capture_dom_snapshot(self) -> dict:
+        """Capture the DOM with layout boxes in one CDP round trip, the session follows self.page"""
+        session = await self.cdp()
+        if self.element_handles:
+            await self.page.evaluate(STAMP_HANDLES_JS, stamp_arguments(False))
+        return await session.send(
+            "DOMSnapshot.captureSnapshot", {"computedStyles": SNAPSHOT_COMPUTED_STYLES})
+
+    async def update_pages(self) -> None:
+        """Extract the whole page into a PagedObservation, unless the DOM is unchanged since the last extraction"""
+        token = await self.page.evaluate(MUTATION_TOKEN_JS)
+        if self.pages is not None and token == self.pages_token and self.tree_url == self.page.url:
+            return
+        snapshot = await self.capture_dom_snapshot()
+        self.tree.fetch_dom_snapshot(snapshot)
+        document = snapshot["documents"][0]
+        viewport_size = self.page.viewport_size or self.viewport_size
+        self.pages = PagedObservation(self.tree, viewport_size["height"],
+                                      document.get("contentHeight", 0), document.get("scrollOffsetY", 0))
+        self.pages_token = token
+        self.tree_url = self.page.url
+
+    def new_tree(self, tree_class: type) -> HTMLTree:
+        tree = tree_class()
+        tree.classifier = self.classifier
+        return tree
+
+    async def update_tree(self) -> None:
+        if self.observation_backend == "js":
+            if self.observe_frames:
+                nodes, frame_nodes = await self.extract_frames(
+                    lambda frame: frame.evaluate(EXTRACT_CANDIDATES_JS, extraction_arguments(self.classifier, self.element_handles)))
+                self.tree.fetch_extracted_nodes(nodes, frame_nodes)
+            else:
+                nodes = await self.page.evaluate(EXTRACT_CANDIDATES_JS, extraction_arguments(self.classifier, self.element_handles))
+                self.tree.fetch_extracted_nodes(nodes)
+        elif self.paged_observation:
+            await self.update_pages()
+        elif self.observation_backend == "cdp_snapshot":
+            snapshot = await self.capture_dom_snapshot()
+            viewport_size = None
+            if self.current_viewport_only:
+                viewport_size = self.page.viewport_size or self.viewport_size
+            self.tree.fetch_dom_snapshot(snapshot, viewport_size)
+        else:
             if not self.html_content.strip():
                 self.html_content = await self.retry_content()
-            self.tree.fetch_html_content(self.html_content)
+            frame_html = "".join(content or "" for _, _, content in self.frame_contents)
+            cache_key = ObservationCache.key(self.html_content + frame_html, self.page.url)
+            tree = self.observation_cache.get(cache_key)
+            if tree is None:
+                # Cached trees are never refetched, so every miss builds a new one
+                if self.incremental_observation:
+                    # previous may be a cached tree older than the last step, it shares
+                    # the number counter of the page with every tree after it
+                    previous = self.tree if isinstance(self.tree, IncrementalHTMLTree) \
+                        and self.tree_url == self.page.url else None
+                    tree = self.new_tree(IncrementalHTMLTree)
+                    tree.fetch_html_content(self.html_content, previous, self.html_parser, self.frame_contents)
+                else:
+                    tree = self.new_tree(HTMLTree)
+                    tree.fetch_html_content(self.html_content, parser=self.html_parser,
+                                            frames=self.frame_contents)
+                self.observation_cache.put(cache_key, tree)
+            else:
+                logger.info(f"-- Reused cached observation ({self.observation_cache.hits} hits, "
+                            f"{self.observation_cache.misses} misses)")
+            self.tree = tree
+            self.tree_url = self.page.url
+
+    async def settle(self, budget_ms: int, reason: str) -> None:
+        """Wait until the page is loaded and quiet, see SETTLE_QUIET_MS, for at most budget_ms.
+        Without adaptive_settle this is the fixed wait of budget_ms it replaces."""
+        if not self.adaptive_settle:
+            await self.page.wait_for_timeout(budget_ms)
+            return
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + budget_ms / 1000
+        while loop.time() < deadline:
+            try:
+                await self.page.wait_for_load_state("load", timeout=(deadline - loop.time()) * 1000)
+                remaining = int((deadline - loop.time()) * 1000)
+                if remaining <= 0:
+                    break
+                quiet = await self.page.evaluate(SETTLE_JS, {"quiet": min(SETTLE_QUIET_MS, remaining),
+                                                             "timeout": remaining})
+            except PlaywrightError:
+                # Timed out, or the page navigated and destroyed the context of the evaluate
+                await asyncio.sleep(0.05)
+                continue
+            if quiet and len(self.inflight_requests) <= SETTLE_MAX_REQUESTS:
+                break
+        waited = (loop.time() - start) * 1000
+        self.settle_times[0] += waited
+        self.settle_times[1] += budget_ms
+        logger.info(f"-- Page settled after {reason} in {waited:.0f} ms of {budget_ms} ms")
+
+    async def get_obs(self, task: str = "") -> Union[str, Tuple[str, str]]:
+        """Observe the page, task ranks which elements fit in max_page_length"""
+        observation = ""
+        observation_VforD = ""
+        self.last_observation_stats = {}
+        if self.adaptive_settle:
+            settle_stats = {"settle_ms": round(self.settle_times[0]), "settle_budget_ms": self.settle_times[1]}
+            self.settle_times = [0.0, 0]
+        try:
+            await self.update_tree()
             logger.info("-- Successfully fetch html content")
             tab_name = await self.page.title()
-            dom_tree = self.tree.build_dom_tree()
+            if self.paged_observation:
+                elements, above, below = self.pages.page_elements()
+            else:
+                elements = self.tree.rendered_elements()
+            compression_stats = {}
+            if self.compress_observation:
+                if self.expanded_url != self.page.url:
+                    self.expanded_groups.clear()
+                    self.expanded_url = self.page.url
+                elements, compression_stats = compress_elements(self.tree, elements, self.expanded_groups)
+            dom_tree, stats = render_within_budget(
+                self.tree, self.max_page_length, task, self.page.viewport_size or self.viewport_size, elements)
+            stats.update(compression_stats)
+            if self.adaptive_settle:
+                stats.update(settle_stats)
+            if self.paged_observation:
+                dom_tree = self.pages.frame(dom_tree, above, below)
+                stats.update({"elements_above": above, "elements_below": below})
+            self.last_observation_stats = stats
+            if stats["saved_tokens"]:
+                logger.info(f"-- Observation trimmed to {stats['kept_elements']}/{stats['elements']} elements, "
+                            f"{stats['saved_tokens']} tokens saved")
             observation = f"current web tab name is \'{tab_name}\'\n" + dom_tree
             if self.mode in ["d_v", "dom_v_desc", "vision_to_dom"]:
                 observation_VforD = await self.capture()
@@ -284,12 +612,12 @@ class AsyncHTMLEnvironment:
                 self.tree.elementNodes[action["element_id"]])
             action.update({"element_id": element_id,
                            "element_name": label})
-            selector, xpath = self.tree.get_selector_and_xpath(
-                action["element_id"])
+            selector = self.element_selector(action["element_id"])
+            target = self.element_frame(action["element_id"])
         except Exception as e:
             logger.error(
                 f"selector:{selector},label_name:{label},element_id: {element_id},error ({e}) in click action.")
-        if label == "link":
+        if label == "link" and target is self.page:
             try:
                 element = self.tree.elementNodes[element_id]
                 url = element["attributes"].get("href")
@@ -299,41 +627,41 @@ class AsyncHTMLEnvironment:
                 # self.last_page = self.page
                 # self.page = await self.context.new_page()
                 await self.page.goto(url, timeout=10000)
-                await self.page.wait_for_timeout(2000)
-                self.html_content = await self.page.content()
+                await self.settle(2000, "link")
+                await self.refresh_html_content()
             except:
                 try:
                     # self.last_page = self.page
                     selector = rf"{selector}"
-                    await self.page.evaluate(f'''(selector) => {{
+                    await target.evaluate(f'''(selector) => {{
                         var element = document.querySelector(selector);
                         if (element) {{
                             element.click();   
                         }} 
                     }}''', selector)
-                    self.html_content = await self.page.content()
+                    await self.refresh_html_content()
                 except Exception as e:
                     raise e
         else:
             try:
                 try:
-                    await self.page.locator(selector).click()
+                    await target.locator(selector).click()
                 except:
                     selector = rf"{selector}"
-                    await self.page.evaluate(f'''(selector) => {{
+                    await target.evaluate(f'''(selector) => {{
                         var element = document.querySelector(selector);
                         if (element) {{
                             element.click();   
                         }} 
                     }}''', selector)
-                await self.page.wait_for_timeout(1000)
-                self.html_content = await self.page.content()
+                await self.settle(1000, "click")
+                await self.refresh_html_content()
             except Exception as e:
                 raise e
 
     async def goto(self, action):
         await self.load_page_with_retry(action['url'])
-        self.html_content = await self.page.content()
+        await self.refresh_html_content()
 
     async def fill_search(self, action):
         try:
@@ -341,21 +669,21 @@ class AsyncHTMLEnvironment:
                 self.tree.elementNodes[action["element_id"]])
             action.update({"element_id": element_id,
                            "element_name": label})
-            selector, xpath = self.tree.get_selector_and_xpath(
-                action["element_id"])
+            selector = self.element_selector(action["element_id"])
+            target = self.element_frame(action["element_id"])
         except Exception as e:
             logger.error(
                 f"selector:{selector},label_name:{label},element_id: {element_id},error ({e}) in fill_search action.")
         try:
             value = stringfy_value(action['fill_text'])
-            await self.page.locator(selector).fill(value)
-            await self.page.locator(selector).press("Enter")
-            self.html_content = await self.page.content()
+            await target.locator(selector).fill(value)
+            await target.locator(selector).press("Enter")
+            await self.refresh_html_content()
         except:
             try:
                 selector = rf"{selector}"
                 value = stringfy_value(action['fill_text'])
-                await self.page.evaluate(f'''
+                await target.evaluate(f'''
                     (selector) => {{
                         var element = document.querySelector(selector);
                         if (element) {{
@@ -365,7 +693,7 @@ class AsyncHTMLEnvironment:
                         }}
                     }}
                 ''', selector)
-                self.html_content = await self.page.content()
+                await self.refresh_html_content()
             except Exception as e:
                 raise e
 
@@ -375,20 +703,20 @@ class AsyncHTMLEnvironment:
                 self.tree.elementNodes[action["element_id"]])
             action.update({"element_id": element_id,
                            "element_name": label})
-            selector, xpath = self.tree.get_selector_and_xpath(
-                action["element_id"])
+            selector = self.element_selector(action["element_id"])
+            target = self.element_frame(action["element_id"])
         except Exception as e:
             logger.error(
                 f"selector:{selector},label_name:{label},element_id: {element_id},error ({e}) in fill_form action.")
         try:
             value = stringfy_value(action['fill_text'])
-            await self.page.locator(selector).fill(value)
-            self.html_content = await self.page.content()
+            await target.locator(selector).fill(value)
+            await self.refresh_html_content()
         except:
             try:
                 selector = rf"{selector}"
                 value = stringfy_value(action['fill_text'])
-                await self.page.evaluate(f'''(selector) => {{
+                await target.evaluate(f'''(selector) => {{
                         var element = document.querySelector(selector);
                         if (element) {{
                             element.value = '{value}';
@@ -396,21 +724,21 @@ class AsyncHTMLEnvironment:
                         }}
                     }}
                 ''', selector)
-                self.html_content = await self.page.content()
+                await self.refresh_html_content()
             except Exception as e:
                 raise e
 
     async def search(self, action):
         await self.page.goto("https://www.google.com/search?q="+action["fill_text"], timeout=30000)
-        await self.page.wait_for_timeout(2000)
-        self.html_content = await self.page.content()
+        await self.settle(2000, "search")
+        await self.refresh_html_content()
 
     async def go_back_last_page(self, action):
         # self.page = self.last_page
         # self.last_page = self.page
         await self.page.go_back()
-        await self.page.wait_for_timeout(2000)
-        self.html_content = await self.page.content()
+        await self.settle(2000, "go_back")
+        await self.refresh_html_content()
 
     async def select_option(self, action):
         try:
@@ -418,14 +746,14 @@ class AsyncHTMLEnvironment:
                 self.tree.elementNodes[action["element_id"]])
             action.update({"element_id": element_id,
                            "element_name": label})
-            selector, xpath = self.tree.get_selector_and_xpath(
-                action["element_id"])
+            selector = self.element_selector(action["element_id"])
+            target = self.element_frame(action["element_id"])
         except Exception as e:
             logger.error(
                 f"selector:{selector},label_name:{label},element_id: {element_id},error ({e}) in select_option action.")
         try:
             selector = rf"{selector}"
-            optgroup_values = await self.page.evaluate(f'''(selector) => {{
+            optgroup_values = await target.evaluate(f'''(selector) => {{
                 var values = [];
                 var selectElement = document.querySelector(selector);
                 var options = selectElement.querySelectorAll('option');
@@ -447,7 +775,7 @@ class AsyncHTMLEnvironment:
                     None, option, action['fill_text']).ratio()
                 if similarity > best_option[2]:
                     best_option = [i, option, similarity]
-            await self.page.evaluate(f'''(selector) => {{
+            await target.evaluate(f'''(selector) => {{
                 var selectElement = document.querySelector(selector);
                 var options = selectElement.querySelectorAll('option');
                 for (var option of options) {{
@@ -469,8 +797,8 @@ class AsyncHTMLEnvironment:
                     }}
                 }}
             }}''', selector)
-            await self.page.wait_for_timeout(2000)
-            self.html_content = await self.page.content()
+            await self.settle(2000, "select_option")
+            await self.refresh_html_content()
         except Exception as e:
             raise e
 
@@ -480,14 +808,14 @@ class AsyncHTMLEnvironment:
                 self.tree.elementNodes[action["element_id"]])
             action.update({"element_id": element_id,
                            "element_name": label})
-            selector, xpath = self.tree.get_selector_and_xpath(
-                action["element_id"])
+            selector = self.element_selector(action["element_id"])
+            target = self.element_frame(action["element_id"])
         except Exception as e:
             logger.error(
                 f"selector:{selector},label_name:{label},element_id: {element_id},error ({e}) in hover action.")
         try:
-            await self.page.hover(selector)
-            self.html_content = await self.page.content()
+            await target.hover(selector)
+            await self.refresh_html_content()
         except:
             hover = '''() => {
                         var element = document.querySelector('%s');
@@ -496,16 +824,35 @@ class AsyncHTMLEnvironment:
                         }
                     }
                 ''' % selector
-            await self.page.evaluate(hover)
-            self.html_content = await self.page.content()
+            await target.evaluate(hover)
+            await self.refresh_html_content()
+
+    async def expand_group(self, action):
+        """Show the groups collapsed under the element of action in full from the next observation on"""
+        parent_id = action["element_id"]
+        keys = [key for key, num in self.tree.groupNumbers.items() if self.tree.nodeDict.get(num) == parent_id]
+        if not keys:
+            raise ValueError(f"element {parent_id} has no collapsed group")
+        self.expanded_groups.update(keys)
+        await self.refresh_html_content()
+
+    async def scroll_paged(self, scroll_y: float) -> None:
+        # The observation follows the cached layout, the browser only has to scroll for clicks and screenshots
+        await self.page.evaluate(f"window.scrollTo(0, {scroll_y})")
+
+    def has_current_pages(self) -> bool:
+        return self.pages is not None and self.tree_url == self.page.url
 
     async def scroll_down(self):
+        if self.has_current_pages():
+            await self.scroll_paged(self.pages.scroll_down())
+            return
         try:
             total_height = await self.page.evaluate("document.body.scrollHeight")
             viewport_height = await self.page.evaluate("window.innerHeight")
             if total_height < viewport_height:
                 await self.page.evaluate("window.scrollBy(0, 500)")
-                self.html_content = await self.page.content()
+                await self.refresh_html_content()
             current_scroll = await self.page.evaluate("window.pageYOffset")
             remaining_height = total_height - current_scroll - viewport_height
             if remaining_height <= viewport_height:
@@ -513,12 +860,15 @@ class AsyncHTMLEnvironment:
             else:
                 scroll_amount = current_scroll + viewport_height * 0.75
                 await self.page.evaluate(f"window.scrollTo(0, {scroll_amount})")
-            self.html_content = await self.page.content()
+            await self.refresh_html_content()
         except:
             await self.page.mouse.wheel(0, 100)
-            self.html_content = await self.page.content()
+            await self.refresh_html_content()
 
     async def scroll_up(self):
+        if self.has_current_pages():
+            await self.scroll_paged(self.pages.scroll_up())
+            return
         try:
             viewport_height = await self.page.evaluate("window.innerHeight")
             current_scroll = await self.page.evaluate("window.pageYOffset")
@@ -528,10 +878,10 @@ class AsyncHTMLEnvironment:
                 else:
                     scroll_amount = current_scroll - viewport_height / 2
                 await self.page.evaluate(f"window.scrollTo(0, {scroll_amount})")
-            self.html_content = await self.page.content()
+            await self.refresh_html_content()
         except:
             await self.page.mouse.wheel(0, -100)
-            self.html_content = await self.page.content()
+            await self.refresh_html_content()
 
     async def execute_action(self, action: Action) -> Union[str, Tuple[str, str]]:
         """
@@ -617,23 +967,30 @@ class AsyncHTMLEnvironment:
                     # print(error_message)
                     raise ActionExecutionError(
                         action['action_type'], error_message) from e
+            case ActionTypes.EXPAND:
+                try:
+                    await self.expand_group(action)
+                except Exception as e:
+                    error_message = f"Failed to execute expand [{action['element_id']}] action. An error({e}) occur"
+                    raise ActionExecutionError(
+                        action['action_type'], error_message) from e
             case ActionTypes.NONE:
                 try:
-                    self.html_content = await self.page.content()
+                    await self.refresh_html_content()
                 except Exception as e:
                     error_message = f"An error({e}) occur"
                     raise ActionExecutionError(
                         action['action_type'], error_message) from e
             case ActionTypes.CACHE_DATA:
                 try:
-                    self.html_content = await self.page.content()
+                    await self.refresh_html_content()
                 except Exception as e:
                     error_message = f"An error({e}) occur"
                     raise ActionExecutionError(
                         action['action_type'], error_message) from e
             case ActionTypes.GET_FINAL_ANSWER:
                 try:
-                    self.html_content = await self.page.content()
+                    await self.refresh_html_content()
                 except Exception as e:
                     error_message = f"An error({e}) occur"
                     raise ActionExecutionError(
@@ -650,39 +1007,56 @@ class AsyncHTMLEnvironment:
         return self.page, selector
 
     async def close(self):
+        if self.request_blocker is not None:
+            stats = self.request_blocker.stats()
+            logger.info(f"-- Blocked {stats['blocked_requests']} requests {stats['blocked_by_type']}, "
+                        f"loaded {stats['loaded_requests']} requests of {stats['loaded_bytes'] / 1024:.0f} KiB")
+        if self.context is None:
+            return
+        # A pooled environment has no playwright of its own, unless it connected to BrowserBase
+        if self.browser_pool is not None and self.playwright is None:
+            await self.close_pooled_context()
+            return
         await self.context.close()
         await self.browser.close()
         await self.playwright.stop()
 
-    @staticmethod
-    def encode_and_resize(image):
-        img_res = 1080
-        w, h = image.size
-        img_res_h = int(img_res * h / w)
-        image = image.resize((img_res, img_res_h))
-        buffer = BytesIO()
-        image.save(buffer, format="PNG")
-        encoded_image = base64.b64encode(buffer.getvalue()).decode("utf-8")
-        return encoded_image
-
-    async def capture(self) -> Image:
+    async def close_pooled_context(self) -> None:
+        """Close the context of this task and give its browser back to the pool"""
+        if self.pooled_browser is None:
+            return
+        pooled, self.pooled_browser = self.pooled_browser, None
+        try:
+            if self.context is not None:
+                await self.context.close()
+        except PlaywrightError as e:
+            logger.error(f"-- Failed to close pooled context: {e!r}")
+        finally:
+            self.context = None
+            await self.browser_pool.release(pooled)
+
+    async def capture(self) -> str:
+        """Base64 screenshot of the viewport, SCREENSHOT_WIDTH px wide.
+        The browser scales and encodes it once in screenshot_format."""
         if not self.page:
             raise ValueError("Page not initialized or loaded.")
-        screenshot_bytes = ""
         for i in range(6):
             try:
-                screenshot_bytes = await self.page.screenshot()
-                break
-            except:
-                logger.info(f'Capture screenshot_bytes failed {i+1} times')
+                session = await self.cdp()
+                viewport = (await session.send("Page.getLayoutMetrics"))["cssVisualViewport"]
+                params = {
+                    "format": self.screenshot_format,
+                    "clip": {"x": viewport["pageX"], "y": viewport["pageY"],
+                             "width": viewport["clientWidth"], "height": viewport["clientHeight"],
+                             "scale": SCREENSHOT_WIDTH / viewport["clientWidth"]}
+                }
+                if self.screenshot_format != "png":
+                    params["quality"] = self.screenshot_quality
+                return (await session.send("Page.captureScreenshot", params))["data"]
+            except Exception:
+                logger.info(f'Capture screenshot failed {i+1} times')
                 await asyncio.sleep(1)
-        else:
-            raise ValueError('Failed to capture screenshot.')
-        screenshot = Image.open(BytesIO(screenshot_bytes)).convert("RGB")
-        encoded_screenshot = self.encode_and_resize(screenshot)
-        is_valid, message = is_valid_base64(
-            encoded_screenshot)
-        return encoded_screenshot
+        raise ValueError('Failed to capture screenshot.')
 
     @staticmethod
     async def is_valid_element(page: Page, selector: str):
@@ -700,7 +1074,7 @@ class AsyncHTMLEnvironment:
         for attempt in range(retries):
             try:
                 await self.page.goto(url, timeout=20000)
-                await self.page.wait_for_timeout(2000)
+                await self.settle(2000, "goto")
                 return
             except Exception as e:
                 if "Timeout" in str(e):
@@ -718,7 +1092,7 @@ class AsyncHTMLEnvironment:
         while retry_count < max_retries:
             try:
                 await self.page.reload()
-                await self.page.wait_for_timeout(3000)
+                await self.settle(3000, "reload")
                 content = await self.page.content()
                 if not content.strip():
                     raise ValueError("Page content is empty")
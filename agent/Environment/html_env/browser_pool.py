@@ -0,0 +1,154 @@
+import asyncio
+import time
+
+from playwright.async_api import async_playwright, Browser
+from playwright.async_api import Error as PlaywrightError
+
+from logs import logger
+
+
+class PooledBrowser:
+    """A browser of a BrowserPool and the number of tasks it has served"""
+
+    def __init__(self, browser: Browser, launch_seconds: float):
+        self.browser = browser
+        self.launchSeconds = launch_seconds
+        self.tasks = 0
+
+
+class BrowserPool:
+    """Warm Chromium browsers shared by the environments of successive tasks.
+
+    Each task gets a fresh BrowserContext, which isolates cookies, storage and
+    pages like a new browser would, in a browser that is already running. A
+    browser is closed and launched again after max_tasks tasks, or when its
+    processes use more than max_memory_mb, which needs the psutil package.
+    """
+
+    def __init__(self, size: int = 1, headless: bool = True, slow_mo: int = 0,
+                 max_tasks: int = 50, max_memory_mb: int = 0):
+        if size < 1:
+            raise ValueError(f"BrowserPool size must be at least 1, got {size}")
+        if max_memory_mb:
+            try:
+                import psutil
+            except ImportError as e:
+                raise ImportError("The memory limit of BrowserPool needs the psutil package") from e
+            self.psutil = psutil
+        self.size = size
+        self.headless = headless
+        self.slow_mo = slow_mo
+        self.max_tasks = max_tasks
+        self.max_memory_mb = max_memory_mb
+        self.playwright = None
+        self.idle = asyncio.Queue()
+        self.browsers: list = []
+        self.launches = 0
+        self.launchSeconds = 0.0
+        self.reuses = 0
+        self.recycles = 0
+
+    async def start(self) -> None:
+        """Launch the browsers of the pool concurrently"""
+        if self.playwright is not None:
+            return
+        self.playwright = await async_playwright().start()
+        for pooled in await asyncio.gather(*(self.launch() for _ in range(self.size))):
+            self.idle.put_nowait(pooled)
+
+    async def launch(self) -> PooledBrowser:
+        start = time.perf_counter()
+        browser = await self.playwright.chromium.launch(headless=self.headless, slow_mo=self.slow_mo)
+        pooled = PooledBrowser(browser, time.perf_counter() - start)
+        self.browsers.append(pooled)
+        self.launches += 1
+        self.launchSeconds += pooled.launchSeconds
+        return pooled
+
+    async def acquire(self) -> PooledBrowser:
+        """An idle browser, waiting for one when all are in use. Browsers that were
+        recycled or disconnected are launched again here."""
+        await self.start()
+        pooled = await self.idle.get()
+        if pooled is None or not pooled.browser.is_connected():
+            if pooled is not None:
+                self.browsers.remove(pooled)
+            try:
+                pooled = await self.launch()
+            except Exception:
+                self.idle.put_nowait(None)
+                raise
+        elif pooled.tasks:
+            self.reuses += 1
+        pooled.tasks += 1
+        return pooled
+
+    async def release(self, pooled: PooledBrowser) -> None:
+        """Return a browser whose task closed its context"""
+        if pooled.tasks >= self.max_tasks or await self.over_memory(pooled):
+            logger.info(f"-- Recycling browser after {pooled.tasks} tasks")
+            self.browsers.remove(pooled)
+            self.recycles += 1
+            try:
+                await pooled.browser.close()
+            except PlaywrightError as e:
+                logger.error(f"-- Failed to close recycled browser: {e!r}")
+            pooled = None
+        self.idle.put_nowait(pooled)
+
+    async def memory_mb(self, pooled: PooledBrowser) -> float:
+        """Resident memory of the browser process and its renderer, GPU and utility processes"""
+        session = await pooled.browser.new_browser_cdp_session()
+        try:
+            processes = (await session.send("SystemInfo.getProcessInfo"))["processInfo"]
+        finally:
+            await session.detach()
+        rss = 0
+        for process in processes:
+            try:
+                rss += self.psutil.Process(process["id"]).memory_info().rss
+            except self.psutil.Error:
+                pass
+        return rss / 2 ** 20
+
+    async def over_memory(self, pooled: PooledBrowser) -> bool:
+        if not self.max_memory_mb or not pooled.browser.is_connected():
+            return False
+        try:
+            return await self.memory_mb(pooled) > self.max_memory_mb
+        except PlaywrightError as e:
+            logger.error(f"-- Failed to measure browser memory: {e!r}")
+            return False
+
+    def stats(self) -> dict:
+        """Launch counts and an estimate of the launch time saved by reusing warm browsers"""
+        mean_launch = self.launchSeconds / self.launches if self.launches else 0.0
+        return {
+            "launches": self.launches,
+            "launch_seconds": self.launchSeconds,
+            "reuses": self.reuses,
+            "recycles": self.recycles,
+            "saved_seconds": self.reuses * mean_launch
+        }
+
+    async def close(self) -> None:
+        stats = self.stats()
+        logger.info(f"-- Browser pool: {stats['launches']} launches in {stats['launch_seconds']:.1f}s, "
+                    f"{stats['reuses']} tasks reused a warm browser, "
+                    f"about {stats['saved_seconds']:.1f}s of launch time saved")
+        for pooled in self.browsers:
+            try:
+                await pooled.browser.close()
+            except PlaywrightError as e:
+                logger.error(f"-- Failed to close pooled browser: {e!r}")
+        self.browsers = []
+        self.idle = asyncio.Queue()
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+
+
+__all__ = [
+    "BrowserPool",
+    "PooledBrowser"
+]
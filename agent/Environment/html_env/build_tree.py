@@ -1,232 +1,550 @@
-from collections import deque
 from lxml.html import etree
-from io import StringIO
+from array import array
+from collections import Counter
+import re
 
-from .utils import ElementNode, TagNameList, MapTagNameList, stringfy_selector
+from .utils import ElementNode, stringfy_selector
+from .node_store import NodeStore, ElementNodeView, ElementNodeList
+from .node_index import NodeIndex
+from .html_parsers import HTMLParserBackend, LxmlParser
 from .active_elements import ActiveElements
+from .element_classifier import ElementClassifier, DEFAULT_CLASSIFIER
+from .dom_extraction import ELEMENT_HANDLE_ATTRIBUTE, SNAPSHOT_COMPUTED_STYLES
 
-
-import copy
+# Characters that lxml refuses in text and attribute values
+XML_INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ud800-\udfff\ufffe\uffff]")
+# Attribute names lxml accepts, this drops framework attributes like @click or v-on:click
+XML_ATTRIBUTE_NAME = re.compile(r"^[^\W\d][\w.\-]*$")
+# Joins the iframe xpaths and the selector of an element inside frames
+FRAME_SEPARATOR = " |> "
+XPATH_STEP = re.compile(r"^(.+)\[(\d+)\]$")
 
 
 class HTMLTree:
+    # Labelling rules, assign an ElementClassifier with site rules to a tree to use them
+    classifier: ElementClassifier = DEFAULT_CLASSIFIER
+
     def __init__(self):
-        self.elementNodes = [ElementNode] * 100000
-        self.rawNode2id: dict = {}
-        self.element2id: dict = {}
-        self.id2rawNode: dict = {}
-        self.valid: list[bool] = [False] * 100000
-        self.nodeCounts: int
+        self.store = NodeStore()
+        self.elementNodes = ElementNodeList(self.store)
+        self.pruningTreeNode = ElementNodeList(self.store, pruned=True)
+        self.valid = bytearray()
+        self.nodeCounts: int = 0
         self.nodeDict = {}
         self.element_value = {}
+        self.locators: dict = {}
+        self.viewport = None
+        self.domTree: str = None
+        self.renderedElements: list = None
+        self.scrollOffset = (0, 0)
+        self.groupNumbers: dict = {}      # numbers of collapsed groups, see compress_elements
+        self.groupValues: dict = {}       # value of the parent node of collapsed groups
+        self.nodeIndex: NodeIndex = None
+        self.frames: list = [(-1, "")]    # (parent frame number, iframe xpath) by frame number, 0 is the page
+        self.frameRoots: dict = {}        # nodeId of the root of each child frame document -> frame number
+        self.labels: list = []            # label of each node, None until classified
+        self.renderedLabels: list = []    # label after climbing map tags, None until classified
+        self.labelSources = array("i")    # nodeId each rendered label comes from
 
-    def fetch_html_content(self, html_content) -> str:
+    def fetch_html_content(self, html_content, parser: HTMLParserBackend = None, frames: list = None) -> str:
+        """Build and prune the tree from page html, parsed by the lxml backend unless parser is given.
+        frames holds the documents of child frames, see parse_html."""
         self.__init__()
-        parser = etree.HTMLParser()
-        self.tree = etree.parse(StringIO(html_content), parser)
-        self.copy_tree = copy.deepcopy(self.tree)
-        root = self.tree.getroot()
-        self.init_html_tree(root)
-        self.build_html_tree(root)
+        root, frame_roots = self.parse_html(html_content, parser, frames)
+        self.ingest_html_tree(root, frame_roots)
         return self.prune_tree()
 
+    def parse_html(self, html_content, parser: HTMLParserBackend = None, frames: list = None) -> tuple:
+        """Parse page html into self.tree with the document of every child frame under its iframe.
+
+        frames lists (parent frame number, iframe xpath, html) for frames 1, 2, ...
+        with parents before their children, html is None for a frame that could
+        not be read. Returns the root and the frame number of each frame root.
+        """
+        parser = parser or LxmlParser()
+        self.tree = parser.parse(html_content)
+        roots = [self.tree.getroot()]
+        frame_roots = {}
+        for parent_number, iframe_xpath, frame_html in frames or ():
+            self.frames.append((parent_number, iframe_xpath))
+            parent_root = roots[parent_number]
+            frame_root = parser.parse(frame_html).getroot() if frame_html and frame_html.strip() else None
+            roots.append(frame_root)
+            if frame_root is None or parent_root is None:
+                continue
+            iframe = self.find_xpath(parent_root, iframe_xpath)
+            (parent_root if iframe is None else iframe).append(frame_root)
+            frame_roots[frame_root] = len(roots) - 1
+        return roots[0], frame_roots
+
+    @staticmethod
+    def find_xpath(root, xpath: str):
+        """Element at an xpath in the format of get_xpath, or None"""
+        steps = xpath.split("/")[1:]
+        if not steps or steps[0] != root.tag:
+            return None
+        element = root
+        for step in steps[1:]:
+            match = XPATH_STEP.match(step)
+            if match is None:
+                return None
+            tag, twin = match.group(1), int(match.group(2))
+            for child in element:
+                if child.tag == tag:
+                    twin -= 1
+                    if twin == 0:
+                        element = child
+                        break
+            else:
+                return None
+        return element
+
     @staticmethod
-    def build_node(node, idx: int) -> ElementNode:
-        elementNode = ElementNode()
-        elementNode["nodeId"] = idx
-        elementNode["tagName"] = node.tag
-        elementNode["text"] = node.text
-        elementNode["attributes"] = node.attrib
-        elementNode["childIds"] = []
-        elementNode["parentId"] = ""
-        elementNode["siblingId"] = ""
-        elementNode["twinId"] = ""
-        elementNode["depth"] = 1
-        elementNode["htmlContents"] = etree.tostring(
-            node, pretty_print=True).decode()
-        return elementNode
-
-    def build_mapping(self) -> None:
-        self.element2id = {value["nodeId"]: index for index,
-                           value in enumerate(self.elementNodes)}
-        self.id2rawNode = {str(index): value for value,
-                           index in self.rawNode2id.items()}
-
-    def init_html_tree(self, root) -> None:
-        node_queue = deque([root])
-        node_id = 0
-        while node_queue:
-            node = node_queue.popleft()
-            self.elementNodes[node_id] = HTMLTree().build_node(node, node_id)
-            self.rawNode2id[node] = node_id
-            node_id += 1
-            for child in node.getchildren():
-                node_queue.append(child)
-        self.build_mapping()
-        self.nodeCounts = node_id
-        self.valid = self.valid[:self.nodeCounts + 1]
-
-    def build_html_tree(self, root) -> None:
-        node_queue = deque([root])
-        root_id = self.rawNode2id[root]
-        self.elementNodes[root_id]["parentId"] = -1
-        while node_queue:
-            node = node_queue.popleft()
-            parent_id = self.rawNode2id[node]
-            tag_st = {}
-            sibling_id = 1
-            for child in node.getchildren():
-                child_id = self.rawNode2id[child]
-                tag_name = self.elementNodes[child_id].get("tagName")
-                tag_st[tag_name] = tag_st.get(tag_name, 0) + 1
-                twin_id = tag_st.get(tag_name)
-                self.elementNodes[parent_id]["childIds"].append(child_id)
-                self.elementNodes[child_id]["parentId"] = parent_id
-                self.elementNodes[child_id]["twinId"] = twin_id
-                self.elementNodes[child_id]["depth"] = self.elementNodes[parent_id]["depth"] + 1
-                self.elementNodes[child_id]["siblingId"] = sibling_id
-                node_queue.append(child)
-                sibling_id += 1
-        self.pruningTreeNode = copy.deepcopy(self.elementNodes)
+    def append_element(parent, tag: str, attributes: dict):
+        try:
+            if parent is None:
+                return etree.Element(tag, attributes)
+            return etree.SubElement(parent, tag, attributes)
+        except ValueError:
+            # Tags such as <fb:like> are not valid lxml names
+            if parent is None:
+                return etree.Element("unknown", attributes)
+            return etree.SubElement(parent, "unknown", attributes)
+
+    def fetch_extracted_nodes(self, nodes: list, frames: list = None) -> None:
+        """Build the tree from the nodes returned by EXTRACT_CANDIDATES_JS.
+        The browser already applied the ActiveElements rules, so nothing is pruned.
+
+        frames lists (parent frame number, iframe xpath, nodes) of child frames,
+        like parse_html. The iframe itself is not extracted, so each frame
+        document goes under the root of its parent frame, one level deeper.
+        """
+        self.__init__()
+        if not nodes:
+            return
+        elements = []
+        extracted = []              # the extracted node of each element
+        depths = []
+        frame_roots = {}
+        roots = []                  # index in elements of the root of each frame document
+        documents = [(-1, "", nodes)] + list(frames or ())
+        for frame_number, (parent_number, iframe_xpath, frame_nodes) in enumerate(documents):
+            parent_root = roots[parent_number] if frame_number else None
+            if frame_number:
+                self.frames.append((parent_number, iframe_xpath))
+                if not frame_nodes or parent_root is None:
+                    roots.append(None)
+                    continue
+            offset = len(elements)
+            roots.append(offset)
+            depth_offset = depths[parent_root] if frame_number else 0
+            for node in frame_nodes:
+                attributes = {name: XML_INVALID_CHARS.sub("", value)
+                              for name, value in node["attributes"].items()}
+                if node["parent"] != -1:
+                    parent = elements[node["parent"] + offset]
+                else:
+                    parent = elements[parent_root] if frame_number else None
+                element = self.append_element(parent, node["tag"], attributes)
+                element.text = XML_INVALID_CHARS.sub("", node["text"]) or None
+                elements.append(element)
+                extracted.append(node)
+                depths.append(node["depth"] + depth_offset)
+            if frame_number:
+                frame_roots[elements[offset]] = frame_number
+        self.tree = etree.ElementTree(elements[0])
+        self.ingest_html_tree(elements[0], frame_roots)
+        node_ids = {raw_node: node_id for node_id,
+                    raw_node in enumerate(self.store.rawNodes)}
+        for element, node, depth in zip(elements, extracted, depths):
+            node_id = node_ids[element]
+            self.store.depths[node_id] = depth
+            self.locators[node_id] = (node["selector"], node["xpath"])
+        self.valid = bytearray(b"\x01" * self.nodeCounts)
+
+    def fetch_dom_snapshot(self, snapshot: dict, viewport_size: dict = None) -> str:
+        """Build and prune the tree from a DOMSnapshot.captureSnapshot result.
+        Layout boxes and computed styles decide visibility, and with a
+        viewport_size only nodes inside the current viewport are kept."""
+        self.__init__()
+        strings = snapshot["strings"]
+        document = snapshot["documents"][0]
+        nodes = document["nodes"]
+        parent_indexes, node_types = nodes["parentIndex"], nodes["nodeType"]
+        node_names, node_values = nodes["nodeName"], nodes["nodeValue"]
+        node_attributes = nodes["attributes"]
+        pseudo_indexes = set(nodes.get("pseudoType", {}).get("index", []))
+        elements = [None] * len(node_types)
+        root = None
+        for index, node_type in enumerate(node_types):
+            parent_index = parent_indexes[index]
+            parent = elements[parent_index] if parent_index >= 0 else None
+            if node_type == 1 and index not in pseudo_indexes:
+                if parent is None and (root is not None or node_types[parent_index] != 9):
+                    # Shadow roots, template contents and other detached subtrees
+                    continue
+                attribute_indexes = node_attributes[index]
+                attributes = {}
+                for k in range(0, len(attribute_indexes), 2):
+                    name = strings[attribute_indexes[k]]
+                    if XML_ATTRIBUTE_NAME.match(name):
+                        attributes[name] = XML_INVALID_CHARS.sub(
+                            "", strings[attribute_indexes[k + 1]])
+                elements[index] = self.append_element(
+                    parent, strings[node_names[index]].lower(), attributes)
+                if root is None:
+                    root = elements[index]
+            elif node_type == 3 and parent is not None and node_values[index] >= 0:
+                text = XML_INVALID_CHARS.sub("", strings[node_values[index]])
+                if len(parent):
+                    parent[-1].tail = (parent[-1].tail or "") + text
+                else:
+                    parent.text = (parent.text or "") + text
+        if root is None:
+            return ""
+        self.tree = etree.ElementTree(root)
+        self.ingest_html_tree(root)
+
+        # Elements without a layout box are not rendered and keep a zero-size box
+        store = self.store
+        store.bounds = array("d", bytes(8 * 4 * self.nodeCounts))
+        store.styleHidden = bytearray(self.nodeCounts)
+        node_ids = {raw_node: node_id for node_id,
+                    raw_node in enumerate(store.rawNodes)}
+        layout = document["layout"]
+        visibility_index = SNAPSHOT_COMPUTED_STYLES.index("visibility")
+        opacity_index = SNAPSHOT_COMPUTED_STYLES.index("opacity")
+        seen = set()
+        for index, bounds, styles in zip(layout["nodeIndex"], layout["bounds"], layout["styles"]):
+            element = elements[index]
+            if element is None or index in seen:
+                continue
+            seen.add(index)
+            node_id = node_ids[element]
+            store.bounds[4 * node_id: 4 * node_id + 4] = array("d", bounds[:4])
+            visibility = strings[styles[visibility_index]] if styles[visibility_index] >= 0 else ""
+            opacity = strings[styles[opacity_index]] if styles[opacity_index] >= 0 else "1"
+            if visibility in ("hidden", "collapse") or opacity == "0":
+                store.styleHidden[node_id] = True
+        self.scrollOffset = (document.get("scrollOffsetX", 0), document.get("scrollOffsetY", 0))
+        if viewport_size:
+            self.viewport = self.scrollOffset + (viewport_size["width"], viewport_size["height"])
+        return self.prune_tree()
+
+    def ingest_html_tree(self, root, frame_roots: dict = None) -> None:
+        self.store.ingest(root)
+        self.nodeCounts = len(self.store)
+        self.valid = bytearray(self.nodeCounts)
+        self.labels = [None] * self.nodeCounts
+        self.renderedLabels = [None] * self.nodeCounts
+        self.labelSources = array("i", bytes(4 * self.nodeCounts))
+        if frame_roots:
+            self.frameRoots = {node_id: frame_roots[raw_node] for node_id, raw_node
+                               in enumerate(self.store.rawNodes) if raw_node in frame_roots}
 
     def get_xpath(self, idx: int) -> str:
+        """Xpath of the node in its own document, the page or a child frame"""
+        if idx in self.locators:
+            return self.locators[idx][1]
+        store = self.store
+        tag_names, tag_ids = store.tagNames, store.tagIds
+        parent_ids, twin_ids = store.parentIds, store.twinIds
         locator_str = ""
-        current_node = self.elementNodes[idx]
-        tag_name = current_node["tagName"]
-        twinId = current_node["twinId"]
-        locator_str = "/" + tag_name + "[" + str(twinId) + "]"
-        while current_node["parentId"] != 0:
-            parentid = current_node["parentId"]
-            current_node = self.elementNodes[parentid]
-            current_tag_name = current_node["tagName"]
-            twinId = current_node["twinId"]
-            locator_str = "/" + current_tag_name + \
-                "[" + str(twinId) + "]" + locator_str
-        parentid = current_node["parentId"]
-        current_node = self.elementNodes[parentid]
-        current_tag_name = current_node["tagName"]
-        return "/" + current_tag_name + locator_str
+        current_id = idx
+        while parent_ids[current_id] != -1 and current_id not in self.frameRoots:
+            locator_str = "/" + tag_names[tag_ids[current_id]] + \
+                "[" + str(twin_ids[current_id]) + "]" + locator_str
+            current_id = parent_ids[current_id]
+        return "/" + tag_names[tag_ids[current_id]] + locator_str
+
+    def build_locators(self) -> None:
+        """Compute the selector and xpath of every valid node in one top-down pass.
+        Node ids are breadth-first, so parents are done before their children,
+        and sibling tag and class uniqueness comes from per-parent counters."""
+        store = self.store
+        raw_nodes, tag_names, tag_ids = store.rawNodes, store.tagNames, store.tagIds
+        parent_ids, twin_ids, child_offsets = store.parentIds, store.twinIds, store.childOffsets
+        valid, locators, frame_roots = self.valid, self.locators, self.frameRoots
+        root_tag_name = tag_names[tag_ids[0]]
+        counted_parent, tag_counts, class_counts = -1, None, None
+        for idx in range(1, self.nodeCounts):
+            if not valid[idx]:
+                continue
+            tag_name = tag_names[tag_ids[idx]]
+            if idx in frame_roots:
+                # Locators inside a frame start from its own document
+                locators[idx] = (tag_name, "/" + tag_name)
+                continue
+            parent_id = parent_ids[idx]
+            if parent_id == 0:
+                parent_selector, parent_xpath = root_tag_name, "/" + root_tag_name
+            else:
+                parent_selector, parent_xpath = locators[parent_id]
+            xpath = parent_xpath + "/" + tag_name + "[" + str(twin_ids[idx]) + "]"
+            raw_node = raw_nodes[idx]
+            element_id = raw_node.get("id")
+            if element_id:
+                locators[idx] = ("#" + stringfy_selector(element_id), xpath)
+                continue
+            first_child, last_child = child_offsets[parent_id], child_offsets[parent_id + 1]
+            if last_child - first_child > 1:
+                if counted_parent != parent_id:
+                    # Valid siblings are contiguous, so one parent is counted at a time
+                    counted_parent = parent_id
+                    tag_counts = Counter(tag_ids[first_child:last_child])
+                    class_counts = Counter(raw_nodes[sib_id].get("class")
+                                           for sib_id in range(first_child, last_child))
+                class_name = raw_node.get("class")
+                if tag_counts[tag_ids[idx]] == 1:
+                    selector = parent_selector + " > " + tag_name
+                elif class_name and class_counts[class_name] == 1:
+                    selector = parent_selector + " > " + tag_name + "." + stringfy_selector(class_name)
+                else:
+                    selector = parent_selector + " > " + tag_name + \
+                        ":nth-child(" + str(store.siblingIds[idx]) + ")"
+            else:
+                selector = parent_selector + " > " + tag_name
+            locators[idx] = (selector, xpath)
 
     def get_selector(self, idx: int) -> str:
+        if idx in self.locators:
+            return self.locators[idx][0]
+        store = self.store
+        raw_nodes, tag_names, tag_ids = store.rawNodes, store.tagNames, store.tagIds
+        parent_ids, child_offsets = store.parentIds, store.childOffsets
         selector_str = ""
-        current_node = self.elementNodes[idx]
-        while current_node["parentId"] != -1:
-            tag_name = current_node["tagName"]
-            siblingId = str(current_node["siblingId"])
-            if current_node["attributes"].get('id'):
-                current_selector = stringfy_selector(
-                    current_node["attributes"].get('id'))
+        current_id = idx
+        while parent_ids[current_id] != -1 and current_id not in self.frameRoots:
+            tag_name = tag_names[tag_ids[current_id]]
+            siblingId = str(store.siblingIds[current_id])
+            attributes = raw_nodes[current_id].attrib
+            if attributes.get('id'):
+                current_selector = stringfy_selector(attributes.get('id'))
                 return "#" + current_selector + selector_str
-            if len(self.elementNodes[current_node["parentId"]]["childIds"]) > 1:
+            parent_id = parent_ids[current_id]
+            first_child, last_child = child_offsets[parent_id], child_offsets[parent_id + 1]
+            if last_child - first_child > 1:
                 uu_twin_node = True
                 uu_id = True
-                for childId in self.elementNodes[current_node["parentId"]]["childIds"]:
-                    sib_node = self.elementNodes[childId]
-                    if sib_node["nodeId"] != current_node["nodeId"] and current_node["attributes"].get('class') and sib_node["attributes"].get("class") == current_node["attributes"].get('class'):
+                class_name = attributes.get('class')
+                for sib_id in range(first_child, last_child):
+                    if sib_id != current_id and class_name and raw_nodes[sib_id].get("class") == class_name:
                         uu_twin_node = False
-                    if sib_node["nodeId"] != current_node["nodeId"] and current_node["tagName"] == sib_node["tagName"]:
+                    if sib_id != current_id and tag_ids[current_id] == tag_ids[sib_id]:
                         uu_id = False
                 if uu_id:
                     selector_str = " > " + tag_name + selector_str
-                elif current_node["attributes"].get('class') and uu_twin_node is True:
+                elif class_name and uu_twin_node is True:
                     # fix div.IbBox.Whs\(n\)
                     selector_str = " > " + tag_name + "." + \
-                        stringfy_selector(
-                            current_node["attributes"].get('class')) + selector_str
+                        stringfy_selector(class_name) + selector_str
                 else:
                     selector_str = " > " + tag_name + \
                         ":nth-child(" + siblingId + ")" + selector_str
             else:
                 selector_str = " > " + tag_name + selector_str
-            current_node = self.elementNodes[current_node["parentId"]]
-        return current_node["tagName"] + selector_str
+            current_id = parent_id
+        return tag_names[tag_ids[current_id]] + selector_str
 
     def is_valid(self, idx: int) -> bool:
-        node = self.pruningTreeNode[idx]
-        if node["tagName"] in TagNameList:
-            return ActiveElements.is_valid_element(node)
+        if self.store.tag_name(idx) in self.classifier.candidateTags:
+            element = self.pruningTreeNode[idx]
+            return ActiveElements.is_interactive(element, self.element_label(idx)) and \
+                ActiveElements.is_visiable(element) and self.is_rendered(idx)
 
-    def prune_tree(self) -> str:
-        """Traverse each element to determine if it is valid and prune"""
-        result_list = []
-        root = self.pruningTreeNode[0]
-        if root is None:
-            result_list = []
-        stack = [root]
-        while stack:
-            node = stack.pop()
-            nodeId = node["nodeId"]
-            result_list.append(nodeId)
-            children = []
-            for childId in node["childIds"]:
-                childNode = self.pruningTreeNode[childId]
-                children.append(childNode)
-            stack.extend(children)
-        result = result_list[::-1]
-        for nodeId in result:
-            if self.is_valid(nodeId) or self.valid[nodeId] is True:
-                rawNode = self.id2rawNode[str(nodeId)]
-                html_contents = etree.tostring(
-                    rawNode, pretty_print=True).decode()
-                self.pruningTreeNode[nodeId]["htmlContents"] = html_contents
-                self.valid[nodeId] = True
-                current_id = nodeId
-                while self.pruningTreeNode[current_id]["parentId"] != -1:
-                    parent_id = self.pruningTreeNode[current_id]["parentId"]
-                    self.valid[parent_id] = True
-                    current_id = parent_id
+    def element_label(self, idx: int) -> str:
+        """Label of the node itself, see ElementClassifier, computed once per node"""
+        label = self.labels[idx]
+        if label is None:
+            attributes = self.store.rawNodes[idx].attrib
+            label = self.labels[idx] = self.classifier.label(
+                self.store.tag_name(idx), attributes.get("type"), attributes.get("role"))
+        return label
+
+    def classify_nodes(self) -> list:
+        """Rendered label of every valid node in one top-down pass, memoized like get_tag_name.
+        Parents come first in breadth-first order, so a map tag finds its parent resolved."""
+        store = self.store
+        parent_ids, valid = store.parentIds, self.valid
+        map_tags = self.classifier.mapTags
+        rendered_labels, label_sources = self.renderedLabels, self.labelSources
+        for idx in range(self.nodeCounts):
+            if not valid[idx] or rendered_labels[idx] is not None:
+                continue
+            label = self.element_label(idx)
+            parent_id = parent_ids[idx]
+            if label != "unknown":
+                rendered_labels[idx], label_sources[idx] = label, idx
+            elif store.tag_name(idx) in map_tags and parent_id != -1:
+                rendered_labels[idx], label_sources[idx] = rendered_labels[parent_id], label_sources[parent_id]
             else:
-                rawNode = self.id2rawNode[str(nodeId)]
-                rawNode.getparent().remove(rawNode)
-                current_node = self.pruningTreeNode[nodeId]
-                current_node["htmlContents"] = ""
-                parentid = current_node["parentId"]
-                self.pruningTreeNode[parentid]["childIds"].remove(nodeId)
-                self.valid[nodeId] = False
+                rendered_labels[idx], label_sources[idx] = "statictext", idx
+        return rendered_labels
+
+    def is_rendered(self, idx: int) -> bool:
+        """Layout check for trees built from a DOM snapshot, always true otherwise"""
+        store = self.store
+        if not store.has_layout():
+            return True
+        if store.tag_name(idx) in ("option", "optgroup") and store.parentIds[idx] != -1:
+            # Options have no box of their own, they follow their select
+            return self.is_rendered(store.parentIds[idx])
+        if store.styleHidden[idx]:
+            return False
+        x, y, width, height = store.bounds[4 * idx: 4 * idx + 4]
+        if width <= 0 or height <= 0 or x + width <= 0 or y + height <= 0:
+            return False
+        if self.viewport is not None:
+            view_x, view_y, view_width, view_height = self.viewport
+            return x < view_x + view_width and x + width > view_x and \
+                y < view_y + view_height and y + height > view_y
+        return True
+
+    def prune_tree(self) -> str:
+        """Keep valid elements and their ancestors and detach everything else.
+
+        Node ids are breadth-first, so visiting them in reverse is a post-order
+        pass in which each kept node only marks its parent. A second top-down
+        pass unlinks just the top of every pruned subtree from lxml, and
+        htmlContents is serialized lazily from the pruned tree afterwards.
+        """
+        store = self.store
+        parent_ids, raw_nodes, detached = store.parentIds, store.rawNodes, store.detached
+        valid = self.valid
+        for node_id in range(self.nodeCounts - 1, -1, -1):
+            if valid[node_id] or self.is_valid(node_id):
+                valid[node_id] = True
+                parent_id = parent_ids[node_id]
+                if parent_id != -1:
+                    valid[parent_id] = True
+        for node_id in range(self.nodeCounts):
+            if valid[node_id]:
+                continue
+            detached[node_id] = True
+            parent_id = parent_ids[node_id]
+            if parent_id != -1 and valid[parent_id]:
+                raw_node = raw_nodes[node_id]
+                raw_node.getparent().remove(raw_node)
+        store.htmlContents.clear()
+        self.build_locators()
         return self.pruningTreeNode[0]["htmlContents"]
 
     def get_element_contents(self, idx: int) -> str:
-        node = self.elementNodes[idx]
-        html_content = node["htmlContents"]
-        return html_content
+        return self.store.full_html_contents(idx)
 
     def get_tag_name(self, element: ElementNode) -> (str, int):  # type: ignore
-        tag_name = ActiveElements.get_element_tagName(element)
-        tag_idx = element["nodeId"]
-        if tag_name == "unknown":
-            tag_name = element["tagName"]
-            tag_idx = element["nodeId"]
-            # TODO Add more mappings
-            if tag_name in MapTagNameList:
-                parent_element = self.pruningTreeNode[element["parentId"]]
-                return self.get_tag_name(parent_element)
-            else:
-                return ("statictext", tag_idx)
-        return (tag_name, tag_idx)
+        """Rendered label of the element and the nodeId it comes from, memoized per node.
+        Unknown elements with a map tag take the label of their parent."""
+        idx = element["nodeId"]
+        if self.renderedLabels[idx] is not None:
+            return self.renderedLabels[idx], self.labelSources[idx]
+        tag_name = self.element_label(idx)
+        if tag_name != "unknown":
+            rendered_label = (tag_name, idx)
+        # TODO Add more mappings
+        elif self.store.tag_name(idx) in self.classifier.mapTags and element["parentId"] != -1:
+            rendered_label = self.get_tag_name(self.pruningTreeNode[element["parentId"]])
+        else:
+            rendered_label = ("statictext", idx)
+        self.renderedLabels[idx], self.labelSources[idx] = rendered_label
+        return rendered_label
 
-    def build_dom_tree(self) -> str:
-        root = self.pruningTreeNode[0]
-        stack = [root]
-        contents = ""
+    def render_element(self, node: ElementNodeView) -> (str, int, str):  # type: ignore
+        """Label, labelled nodeId and content text of one node, nodes without content text are not rendered"""
+        content_text = self.process_element_contents(node)
+        if content_text == "":
+            return "", node.nodeId, ""
+        tag_name, tag_idx = self.get_tag_name(node)
+        return tag_name, tag_idx, content_text
+
+    def element_number(self, node_id: int, last_number: int) -> int:
+        """Number shown for the next rendered element"""
+        return last_number + 1
+
+    def reserve_number(self) -> int:
+        """A number no element of the tree is shown with, for lines that stand for several nodes"""
+        return max(self.nodeDict, default=0) + 1
+
+    def iter_rendered_elements(self):
+        """Yield (nodeId, tag_name, line) for every line of the accessibility
+        tree in document order. nodeDict and element_value fill as it advances."""
+        self.classify_nodes()
+        store = self.store
+        depths, child_offsets, valid = store.depths, store.childOffsets, self.valid
+        # One view is moved along the traversal instead of allocating one per node
+        node = ElementNodeView(store, 0, pruned=True)
+        indents = [""]
+        stack = [0] if valid and valid[0] else []
         num = 0
         while stack:
-            node = stack.pop()
-            if self.valid[node["nodeId"]] is True:
-                content_text = HTMLTree().process_element_contents(node)
-                if content_text != "":
-                    tag_name, tag_idx = self.get_tag_name(
-                        node)
-                    if tag_name.lower() != "statictext":
-                        num += 1
-                        self.nodeDict[num] = tag_idx
-                        contents += "  " * (node["depth"]-1) + "[" + str(num) + "] " + tag_name + \
-                            " " + f"\'{content_text}\'" + "\n"
-                        self.element_value[str(tag_idx)] = content_text
-            children = []
-            for child_id in node["childIds"]:
-                children.append(self.pruningTreeNode[child_id])
-            stack.extend(reversed(children))
-        return contents
+            node_id = stack.pop()
+            node.nodeId = node_id
+            tag_name, tag_idx, content_text = self.render_element(node)
+            if content_text != "":
+                if tag_name.lower() != "statictext":
+                    num = self.element_number(node_id, num)
+                    self.nodeDict[num] = tag_idx
+                    self.element_value[tag_idx] = content_text
+                    depth = depths[node_id]
+                    while len(indents) < depth:
+                        indents.append(indents[-1] + "  ")
+                    yield node_id, tag_name, f"{indents[depth - 1]}[{num}] {tag_name} \'{content_text}\'\n"
+            for child_id in range(child_offsets[node_id + 1] - 1, child_offsets[node_id] - 1, -1):
+                if valid[child_id]:
+                    stack.append(child_id)
+
+    def iter_dom_tree(self, chunk_size: int = 0):
+        """Yield the accessibility tree line by line, or in chunks of at least
+        chunk_size characters. nodeDict and element_value fill as it advances."""
+        chunk = []
+        chunk_length = 0
+        for _, _, line in self.iter_rendered_elements():
+            if chunk_size <= 0:
+                yield line
+                continue
+            chunk.append(line)
+            chunk_length += len(line)
+            if chunk_length >= chunk_size:
+                yield "".join(chunk)
+                chunk.clear()
+                chunk_length = 0
+        if chunk:
+            yield "".join(chunk)
+
+    def build_dom_tree(self) -> str:
+        """Render the accessibility tree once, later calls return the same string"""
+        if self.domTree is None:
+            self.domTree = "".join(self.iter_dom_tree())
+        return self.domTree
+
+    def rendered_elements(self) -> list:
+        """(nodeId, tag_name, line) of every rendered line, kept for later calls"""
+        if self.renderedElements is None:
+            self.renderedElements = list(self.iter_rendered_elements())
+            self.domTree = "".join(line for _, _, line in self.renderedElements)
+        return self.renderedElements
+
+    def is_changed(self, idx: int) -> bool:
+        """Whether the node changed since the previous observation, unknown for plain trees"""
+        return False
+
+    def node_index(self) -> NodeIndex:
+        """Inverted indexes over every node, built on the first query and kept with the tree"""
+        if self.nodeIndex is None:
+            self.nodeIndex = NodeIndex(self.store)
+        return self.nodeIndex
+
+    def find(self, tag: str = None, role: str = None, element_id: str = None, class_name: str = None,
+             text: str = None, text_contains: str = None, attributes: dict = None,
+             valid_only: bool = True) -> list:
+        """nodeIds matching every given criterion, see NodeIndex.find.
+        With valid_only nodes removed by pruning are left out."""
+        node_ids = self.node_index().find(tag=tag, role=role, element_id=element_id, class_name=class_name,
+                                          text=text, text_contains=text_contains, attributes=attributes)
+        if valid_only:
+            valid = self.valid
+            return [node_id for node_id in node_ids if valid[node_id]]
+        return node_ids
 
     def get_selector_and_xpath(self, idx: int) -> (str, str):  # type: ignore
         try:
@@ -236,6 +554,35 @@ class HTMLTree:
         except:
             print(f"can't locate element")
 
+    def get_handle_selector(self, idx: int) -> str:
+        """Selector of the handle STAMP_HANDLES_JS gave the node in its frame, None when it has none"""
+        handle = self.store.rawNodes[idx].get(ELEMENT_HANDLE_ATTRIBUTE)
+        return f'[{ELEMENT_HANDLE_ATTRIBUTE}="{handle}"]' if handle else None
+
+    def get_frame(self, idx: int) -> int:
+        """Number of the frame whose document holds the node, 0 for the page"""
+        parent_ids, frame_roots = self.store.parentIds, self.frameRoots
+        while idx != -1:
+            if idx in frame_roots:
+                return frame_roots[idx]
+            idx = parent_ids[idx]
+        return 0
+
+    def get_frame_selector_and_xpath(self, idx: int) -> (str, str):  # type: ignore
+        """Selector and xpath qualified by the xpaths of the iframes holding the node,
+        outermost first and joined by FRAME_SEPARATOR. Nodes of the page get the plain ones."""
+        locators = self.get_selector_and_xpath(idx)
+        frame_number = self.get_frame(idx)
+        if locators is None or frame_number == 0:
+            return locators
+        selector, xpath = locators
+        iframe_xpaths = []
+        while frame_number > 0:
+            frame_number, iframe_xpath = self.frames[frame_number]
+            iframe_xpaths.append(iframe_xpath)
+        prefix = FRAME_SEPARATOR.join(reversed(iframe_xpaths)) + FRAME_SEPARATOR
+        return prefix + selector, prefix + xpath
+
     @staticmethod
     def process_element_contents(element: ElementNode) -> str:
         # TODO Add appropriate interactive element information, currently only processing interactive elements with text attributes
@@ -245,9 +592,12 @@ class HTMLTree:
         return html_text.replace("\n", "").replace("\t", "").strip()
 
     def get_element_value(self, element_id: int) -> str:
-        return self.element_value[str(element_id)]
+        if element_id not in self.element_value and element_id in self.groupValues:
+            return self.groupValues[element_id]
+        return self.element_value[element_id]
 
 
 __all__ = [
+    "FRAME_SEPARATOR",
     "HTMLTree"
 ]
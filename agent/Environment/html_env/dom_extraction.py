@@ -0,0 +1,341 @@
+from .utils import TypeList
+from .element_classifier import ElementClassifier, DEFAULT_CLASSIFIER
+
+
+# Walks the live DOM once and applies the ActiveElements rules with computed
+# styles and layout instead of inline style attributes. Only nodes that render
+# a line of the accessibility tree, and their ancestors, are returned, in
+# document order. Each node is
+#   {"parent": index of the parent node or -1, "depth": 1 for <html>,
+#    "tag": lower-case tag name, "text": leading text before the first child,
+#    "attributes": {...}, "selector": css selector, "xpath": xpath}
+# Selectors and xpaths follow HTMLTree.get_selector and HTMLTree.get_xpath.
+# With args.handleAttribute the returned nodes are stamped like STAMP_HANDLES_JS.
+EXTRACT_CANDIDATES_JS = r"""
+(args) => {
+    const tagNames = new Set(args.tagNames);
+    const mapTagNames = new Set(args.mapTagNames);
+    const types = new Set(args.types);
+    const keptAttributes = args.attributes;
+    const labels = args.labels;
+    const handleAttribute = args.handleAttribute;
+
+    function tagOf(el) {
+        return el.tagName.toLowerCase();
+    }
+
+    // ElementClassifier.label: tag, type and role, then tag and type, tag and role, tag alone
+    function elementLabel(el) {
+        const tag = tagOf(el);
+        const type = el.getAttribute('type') || '';
+        const role = el.getAttribute('role') || '';
+        for (const key of [tag + '|' + type + '|' + role, tag + '|' + type + '|', tag + '||' + role, tag + '||']) {
+            if (Object.prototype.hasOwnProperty.call(labels, key)) return labels[key];
+        }
+        return 'unknown';
+    }
+
+    // ActiveElements.is_interactive
+    function isInteractive(el, label) {
+        if (label === 'input' && el.getAttribute('type') === 'hidden') return false;
+        if (['select', 'option', 'input', 'textarea', 'button'].includes(label) && el.hasAttribute('disabled')) return false;
+        return true;
+    }
+
+    // ActiveElements.is_visiable, using the computed style and layout box
+    function isVisible(el, tag) {
+        if (el.getAttribute('aria-hidden') === 'true') return false;
+        const style = window.getComputedStyle(el);
+        if (style.display === 'none' || style.visibility === 'hidden' ||
+            style.visibility === 'collapse' || parseFloat(style.opacity) === 0) return false;
+        // Options report an empty box while their select is closed
+        if (tag === 'option' || tag === 'optgroup' || style.display === 'contents') return true;
+        const rect = el.getBoundingClientRect();
+        return rect.width !== 0 && rect.height !== 0;
+    }
+
+    // lxml's element.text: the text nodes before the first child node
+    function leadingText(el) {
+        let text = '';
+        for (let child = el.firstChild; child && child.nodeType === Node.TEXT_NODE; child = child.nextSibling) {
+            text += child.data;
+        }
+        return text;
+    }
+
+    // ActiveElements.get_element_value followed by HTMLTree.process_element_contents
+    function contentText(el, text) {
+        let value = text;
+        if (!value) {
+            for (const name of ['title', 'placeholder', 'aria-label', 'aria-checked']) {
+                value = el.getAttribute(name);
+                if (value) break;
+            }
+        }
+        if (!value) {
+            const type = el.getAttribute('type');
+            if (types.has(type)) value = type;
+            else if (tagOf(el) === 'select') value = 'Select an option value';
+        }
+        return (value || '').replace(/[\n\t]/g, '').trim();
+    }
+
+    // HTMLTree.get_tag_name
+    function renderedLabel(el) {
+        let label = elementLabel(el);
+        while (label === 'unknown' && mapTagNames.has(tagOf(el)) && el.parentElement) {
+            el = el.parentElement;
+            label = elementLabel(el);
+        }
+        return label === 'unknown' ? 'statictext' : label;
+    }
+
+    // utils.stringfy_selector
+    function stringfySelector(value) {
+        value = value.replace(/[\t\n]/g, ' ').trim().split(/\s+/).join(' ');
+        for (const char of "#.>+~[]():*^$|=%@!'") {
+            value = value.split(char).join('\\' + char);
+        }
+        value = value.split(' ').join('.');
+        if (/^\d/.test(value)) {
+            value = '\\' + value.charCodeAt(0).toString(16).toUpperCase() + ' ' + value.slice(1);
+        }
+        return value;
+    }
+
+    const selectorParts = new Map();
+    function selectorPart(el) {
+        let part = selectorParts.get(el);
+        if (part !== undefined) return part;
+        const tag = tagOf(el);
+        const siblings = el.parentElement.children;
+        part = ' > ' + tag;
+        if (siblings.length > 1) {
+            const className = el.getAttribute('class');
+            let uniqueTag = true;
+            let uniqueClass = true;
+            let position = 0;
+            for (let i = 0; i < siblings.length; i++) {
+                const sibling = siblings[i];
+                if (sibling === el) {
+                    position = i + 1;
+                    continue;
+                }
+                if (className && sibling.getAttribute('class') === className) uniqueClass = false;
+                if (sibling.tagName === el.tagName) uniqueTag = false;
+            }
+            if (!uniqueTag) {
+                part = className && uniqueClass ? ' > ' + tag + '.' + stringfySelector(className)
+                    : ' > ' + tag + ':nth-child(' + position + ')';
+            }
+        }
+        selectorParts.set(el, part);
+        return part;
+    }
+
+    function getSelector(el) {
+        let selector = '';
+        while (el.parentElement) {
+            const id = el.getAttribute('id');
+            if (id && id.trim()) return '#' + stringfySelector(id) + selector;
+            selector = selectorPart(el) + selector;
+            el = el.parentElement;
+        }
+        return tagOf(el) + selector;
+    }
+
+    function getXpath(el) {
+        let xpath = '';
+        while (el.parentElement) {
+            let twin = 1;
+            for (let sibling = el.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+                if (sibling.tagName === el.tagName) twin++;
+            }
+            xpath = '/' + tagOf(el) + '[' + twin + ']' + xpath;
+            el = el.parentElement;
+        }
+        return '/' + tagOf(el) + xpath;
+    }
+
+    // STAMP_HANDLES_JS for one element
+    const handles = handleAttribute ? (window.__webcanvasHandles = window.__webcanvasHandles ||
+        {count: 0, elements: new WeakMap()}) : null;
+    function stamp(el) {
+        let handle = handles.elements.get(el);
+        if (handle === undefined) {
+            handle = String(++handles.count);
+            handles.elements.set(el, handle);
+        }
+        if (el.getAttribute(handleAttribute) !== handle) el.setAttribute(handleAttribute, handle);
+    }
+
+    const root = document.documentElement;
+    if (!root) return [];
+    const kept = new Set([root]);
+    const texts = new Map();
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+    for (let el = walker.nextNode(); el; el = walker.nextNode()) {
+        const tag = tagOf(el);
+        if (!tagNames.has(tag)) continue;
+        if (!isInteractive(el, elementLabel(el)) || !isVisible(el, tag)) continue;
+        const text = leadingText(el);
+        if (contentText(el, text) === '' || renderedLabel(el) === 'statictext') continue;
+        texts.set(el, text);
+        for (let node = el; node && !kept.has(node); node = node.parentElement) {
+            kept.add(node);
+        }
+    }
+
+    const nodes = [];
+    const indexes = new Map();
+    const stack = [[root, -1, 1]];
+    while (stack.length) {
+        const [el, parent, depth] = stack.pop();
+        if (handles) stamp(el);
+        const attributes = {};
+        for (const name of keptAttributes) {
+            const value = el.getAttribute(name);
+            if (value !== null) attributes[name] = value;
+        }
+        indexes.set(el, nodes.length);
+        nodes.push({
+            parent: parent,
+            depth: depth,
+            tag: tagOf(el),
+            text: texts.has(el) ? texts.get(el) : leadingText(el),
+            attributes: attributes,
+            selector: getSelector(el),
+            xpath: getXpath(el)
+        });
+        const children = Array.from(el.children).filter(child => kept.has(child));
+        for (let i = children.length - 1; i >= 0; i--) {
+            stack.push([children[i], indexes.get(el), depth + 1]);
+        }
+    }
+    return nodes;
+}
+"""
+
+# Returns [document token, mutation count] for the current document. The first
+# call installs a MutationObserver, a new document gets a new token.
+MUTATION_TOKEN_JS = r"""
+() => {
+    if (window.__webcanvasMutations === undefined) {
+        window.__webcanvasMutations = 0;
+        window.__webcanvasDocument = Math.random();
+        // Stamping handles is not a change of the page
+        new MutationObserver((records) => {
+            if (records.some(record => record.attributeName !== 'data-wc-id')) window.__webcanvasMutations++;
+        }).observe(document, {
+            subtree: true, childList: true, attributes: true, characterData: true
+        });
+    }
+    return [window.__webcanvasDocument, window.__webcanvasMutations];
+}
+"""
+
+# Resolves true once the document had no mutation for args.quiet ms, or false
+# after args.timeout ms of mutations. Used to wait until a page settles.
+SETTLE_JS = r"""
+(args) => new Promise((resolve) => {
+    let quietTimer = null;
+    const observer = new MutationObserver(() => {
+        clearTimeout(quietTimer);
+        quietTimer = setTimeout(done, args.quiet, true);
+    });
+    const timeoutTimer = setTimeout(done, args.timeout, false);
+    function done(quiet) {
+        observer.disconnect();
+        clearTimeout(quietTimer);
+        clearTimeout(timeoutTimer);
+        resolve(quiet);
+    }
+    observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    quietTimer = setTimeout(done, args.quiet, true);
+})
+"""
+
+# Attribute holding the handle of an element, actions locate elements by it
+ELEMENT_HANDLE_ATTRIBUTE = "data-wc-id"
+
+# Stamps every element of the document with a handle in args.attribute and,
+# with args.serialize, returns the document html like page.content(). An element
+# keeps its handle across calls, new elements continue the count of the
+# document, and a handle copied by cloneNode is replaced.
+STAMP_HANDLES_JS = r"""
+(args) => {
+    const handles = window.__webcanvasHandles = window.__webcanvasHandles ||
+        {count: 0, elements: new WeakMap()};
+    const root = document.documentElement;
+    if (root) {
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT);
+        for (let el = root; el; el = walker.nextNode()) {
+            let handle = handles.elements.get(el);
+            if (handle === undefined) {
+                handle = String(++handles.count);
+                handles.elements.set(el, handle);
+            }
+            if (el.getAttribute(args.attribute) !== handle) el.setAttribute(args.attribute, handle);
+        }
+    }
+    if (!args.serialize) return null;
+    let html = document.doctype ? new XMLSerializer().serializeToString(document.doctype) : '';
+    return root ? html + root.outerHTML : html;
+}
+"""
+
+# Xpath of an element in its own document, in the format of HTMLTree.get_xpath.
+# Evaluated on the iframe element of a child frame to find where its document goes.
+FRAME_XPATH_JS = r"""
+(el) => {
+    let xpath = '';
+    while (el.parentElement) {
+        let twin = 1;
+        for (let sibling = el.previousElementSibling; sibling; sibling = sibling.previousElementSibling) {
+            if (sibling.tagName === el.tagName) twin++;
+        }
+        xpath = '/' + el.tagName.toLowerCase() + '[' + twin + ']' + xpath;
+        el = el.parentElement;
+    }
+    return '/' + el.tagName.toLowerCase() + xpath;
+}
+"""
+
+# Computed styles requested from DOMSnapshot.captureSnapshot, in the order
+# HTMLTree.fetch_dom_snapshot reads them. display: none leaves no layout box.
+SNAPSHOT_COMPUTED_STYLES = ["visibility", "opacity"]
+
+# Attributes read by ActiveElements, the selector builder and the click handler
+EXTRACTED_ATTRIBUTES = [
+    "id", "class", "type", "role", "href", "title", "placeholder",
+    "aria-label", "aria-checked", "disabled", "name", ELEMENT_HANDLE_ATTRIBUTE
+]
+
+
+def extraction_arguments(classifier: ElementClassifier = DEFAULT_CLASSIFIER, handles: bool = False) -> dict:
+    return {
+        "tagNames": sorted(classifier.candidateTags),
+        "mapTagNames": sorted(classifier.mapTags),
+        "labels": classifier.extraction_labels(),
+        "types": TypeList,
+        "attributes": EXTRACTED_ATTRIBUTES,
+        "handleAttribute": ELEMENT_HANDLE_ATTRIBUTE if handles else None
+    }
+
+
+def stamp_arguments(serialize: bool) -> dict:
+    return {"attribute": ELEMENT_HANDLE_ATTRIBUTE, "serialize": serialize}
+
+
+__all__ = [
+    "ELEMENT_HANDLE_ATTRIBUTE",
+    "EXTRACT_CANDIDATES_JS",
+    "EXTRACTED_ATTRIBUTES",
+    "FRAME_XPATH_JS",
+    "MUTATION_TOKEN_JS",
+    "SETTLE_JS",
+    "SNAPSHOT_COMPUTED_STYLES",
+    "STAMP_HANDLES_JS",
+    "extraction_arguments",
+    "stamp_arguments"
+]
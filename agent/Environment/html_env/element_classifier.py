@@ -0,0 +1,93 @@
+import toml
+
+from .utils import TagNameList, MapTagNameList, ConditionTagNameList
+
+# Label of each ARIA role on the tags of ConditionTagNameList
+ROLE_LABELS = {
+    "button": "button", "link": "link", "menuitem": "link", "textbox": "input",
+    "checkbox": "checkbox", "radio": "radio", "tab": "link", "switch": "switch",
+    "option": "option", "row": "row", "search-box": "search-box"
+}
+
+# (tag, type attribute, role attribute, label), None matches any value. A rule
+# with a type wins over one with a role, which wins over the tag alone, and an
+# element no rule matches is "unknown".
+LABEL_RULES = [
+    ("input", None, None, "input"),
+    ("input", "checkbox", None, "checkbox"),
+    ("input", "radio", None, "radio"),
+    ("input", "button", None, "button"),
+    ("select", None, None, "select"),
+    ("optgroup", None, None, "optgroup"),
+    ("textarea", None, None, "textarea"),
+    ("option", None, None, "option"),
+    ("datalist", None, None, "datalist"),
+    ("button", None, None, "button"),
+    ("a", None, None, "link"),
+] + [(tag, None, role, label) for tag in ConditionTagNameList for role, label in ROLE_LABELS.items()]
+
+
+class ElementClassifier:
+    """ActiveElements labelling compiled from a rule table.
+
+    Rules become one dict keyed by (tag, type, role) and the tag lists become
+    frozensets, so labelling an element is at most four dict lookups. Site
+    rules extend the table from a TOML file, see with_rules.
+    """
+
+    def __init__(self, label_rules: list = LABEL_RULES, candidate_tags=TagNameList, map_tags=MapTagNameList):
+        self.labelRules = list(label_rules)
+        self.labels = {(tag, element_type, role): label for tag, element_type, role, label in self.labelRules}
+        self.labelledTags = frozenset(tag for tag, _, _, _ in self.labelRules)
+        self.candidateTags = frozenset(candidate_tags)      # tags pruning checks at all
+        self.mapTags = frozenset(map_tags)                  # unknown tags labelled by their parent
+
+    def label(self, tag: str, element_type: str = None, role: str = None) -> str:
+        tag = tag.lower()
+        if tag not in self.labelledTags:
+            return "unknown"
+        labels = self.labels
+        for key in ((tag, element_type, role), (tag, element_type, None), (tag, None, role), (tag, None, None)):
+            label = labels.get(key)
+            if label is not None:
+                return label
+        return "unknown"
+
+    def with_rules(self, rules: dict) -> "ElementClassifier":
+        """Classifier with site rules added, rules is a dict like
+
+            candidate_tags = ["summary"]
+            map_tags = ["em"]
+            [[labels]]
+            tag = "summary"
+            label = "button"
+
+        where labels may also give type and role. A site rule replaces a
+        built-in rule with the same tag, type and role.
+        """
+        label_rules = self.labelRules + [(rule["tag"].lower(), rule.get("type"), rule.get("role"), rule["label"])
+                                         for rule in rules.get("labels", [])]
+        return ElementClassifier(label_rules,
+                                 self.candidateTags | frozenset(rules.get("candidate_tags", [])),
+                                 self.mapTags | frozenset(rules.get("map_tags", [])))
+
+    @classmethod
+    def from_file(cls, path: str) -> "ElementClassifier":
+        """Built-in rules extended with the site rules of a TOML file"""
+        return DEFAULT_CLASSIFIER.with_rules(toml.load(path))
+
+    def extraction_labels(self) -> dict:
+        """The label table keyed by "tag|type|role" with "" for None, for EXTRACT_CANDIDATES_JS"""
+        return {f"{tag}|{element_type or ''}|{role or ''}": label
+                for (tag, element_type, role), label in self.labels.items()}
+
+
+DEFAULT_CLASSIFIER = ElementClassifier()
+
+
+__all__ = [
+    "DEFAULT_CLASSIFIER",
+    "ElementClassifier",
+    "LABEL_RULES",
+    "ROLE_LABELS"
+]
@@ -0,0 +1,82 @@
+from io import StringIO
+
+from lxml.html import etree
+
+
+class HTMLParserBackend:
+    """Parses page html into the lxml tree HTMLTree is built from"""
+    name = ""
+
+    def parse(self, html_content) -> etree._ElementTree:
+        raise NotImplementedError
+
+
+class LxmlParser(HTMLParserBackend):
+    """libxml2 reading the decoded page through StringIO"""
+    name = "lxml"
+
+    def parse(self, html_content) -> etree._ElementTree:
+        return etree.parse(StringIO(html_content), etree.HTMLParser())
+
+
+class LxmlBytesParser(HTMLParserBackend):
+    """libxml2 reading UTF-8 bytes in one buffer, without the StringIO reads.
+    Bytes are parsed as they are, lone surrogates in a str become U+FFFD."""
+    name = "lxml_bytes"
+
+    def __init__(self):
+        # Reused for every page, lxml parsers may be reused but not shared between threads
+        self.parser = etree.HTMLParser(encoding="utf-8")
+
+    def parse(self, html_content) -> etree._ElementTree:
+        if isinstance(html_content, str):
+            html_content = html_content.encode("utf-8", "replace")
+        return etree.ElementTree(etree.fromstring(html_content, self.parser))
+
+
+class Html5Parser(HTMLParserBackend):
+    """HTML5 parsing in C with the html5-parser package, which builds lxml trees
+    directly. Its tree follows the HTML5 algorithm, so it can differ from libxml2
+    on malformed markup, for instance in where tbody or stray tags end up.
+    Experimental: it inserts tbody into tables written without one, so its
+    observations differ from lxml on well-formed pages too, and it parses
+    the synthetic benchmark pages at about half the speed of lxml."""
+    name = "html5"
+
+    def __init__(self):
+        try:
+            import html5_parser
+        except ImportError as e:
+            raise ImportError("The html5 parser backend needs the html5-parser package") from e
+        except RuntimeError as e:
+            # html5-parser refuses to load next to an lxml built with another libxml2
+            raise ImportError("The html5 parser backend needs html5-parser and lxml built against "
+                              "the same libxml2, see pip install --no-binary lxml lxml") from e
+        self.html5_parser = html5_parser
+
+    def parse(self, html_content) -> etree._ElementTree:
+        root = self.html5_parser.parse(html_content, treebuilder="lxml", namespace_elements=False,
+                                       keep_doctype=False, sanitize_names=True)
+        return root.getroottree()
+
+
+HTML_PARSER_BACKENDS = {
+    backend.name: backend for backend in (LxmlParser, LxmlBytesParser, Html5Parser)
+}
+
+
+def create_html_parser(name: str = "lxml") -> HTMLParserBackend:
+    if name not in HTML_PARSER_BACKENDS:
+        raise ValueError(
+            f"html_parser must be one of {tuple(HTML_PARSER_BACKENDS)}, got {name}")
+    return HTML_PARSER_BACKENDS[name]()
+
+
+__all__ = [
+    "HTMLParserBackend",
+    "LxmlParser",
+    "LxmlBytesParser",
+    "Html5Parser",
+    "HTML_PARSER_BACKENDS",
+    "create_html_parser"
+]
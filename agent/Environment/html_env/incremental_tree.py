@@ -0,0 +1,168 @@
+from array import array
+from itertools import count
+
+from .build_tree import HTMLTree
+from .html_parsers import HTMLParserBackend
+from .node_store import ElementNodeView
+
+
+class IncrementalHTMLTree(HTMLTree):
+    """HTMLTree that reuses the work done for the previous observation.
+
+    Every node and every subtree is hashed from its tags, attributes and text.
+    The new tree is aligned with the previous one top-down: identical subtrees
+    are paired node by node, and below a changed node children are paired by
+    subtree hash and then by tag and position. Identical subtrees keep their
+    pruning result, paired nodes whose label path is unchanged keep their
+    rendered label and text, and every paired element keeps the number it had
+    in the previous observation. New elements get numbers not used before.
+
+    Numbers are drawn from a counter that every tree aligned with a previous
+    one shares with it. The previous tree may be older than the last one, for
+    instance from the observation cache, and still never hands out a number
+    a later tree of the page already showed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.ownHashes = array("q")
+        self.subtreeHashes = array("q")
+        self.aligned: dict = {}             # nodeId -> nodeId of the paired previous node
+        self.unchanged: dict = {}           # same, for nodes inside identical subtrees
+        self.renderResults: dict = {}       # nodeId -> (tag_name, levels climbed for the label, content_text)
+        self.renderedNumbers: dict = {}     # nodeId -> number shown in the observation
+        self.numbers = count(1)              # shared with the trees aligned with this one
+        self.previousValid = bytearray()
+        self.previousOwnHashes = array("q")
+        self.previousParentIds = array("i")
+        self.previousRenderResults: dict = {}
+        self.previousNumbers: dict = {}
+
+    def fetch_html_content(self, html_content, previous: "IncrementalHTMLTree" = None,
+                           parser: HTMLParserBackend = None, frames: list = None) -> str:
+        self.__init__()
+        root, frame_roots = self.parse_html(html_content, parser, frames)
+        self.ingest_html_tree(root, frame_roots)
+        self.hash_subtrees()
+        if previous is not None and previous.nodeCounts:
+            self.align(previous)
+        return self.prune_tree()
+
+    def hash_subtrees(self) -> None:
+        """Hash every node and subtree bottom-up, children have larger ids than their parent"""
+        store = self.store
+        raw_nodes, child_offsets = store.rawNodes, store.childOffsets
+        own_hashes = self.ownHashes = array("q", bytes(8 * self.nodeCounts))
+        hashes = self.subtreeHashes = array("q", bytes(8 * self.nodeCounts))
+        for node_id in range(self.nodeCounts - 1, -1, -1):
+            raw_node = raw_nodes[node_id]
+            own_hashes[node_id] = own_hash = hash(
+                (raw_node.tag, tuple(raw_node.attrib.items()), raw_node.text))
+            hashes[node_id] = hash(
+                (own_hash, tuple(hashes[child_offsets[node_id]:child_offsets[node_id + 1]])))
+
+    def align(self, previous: "IncrementalHTMLTree") -> None:
+        store, previous_store = self.store, previous.store
+        hashes, previous_hashes = self.subtreeHashes, previous.subtreeHashes
+        aligned, unchanged = self.aligned, self.unchanged
+        # Only what rendering needs is kept, not the previous tree itself
+        self.previousValid = previous.valid
+        self.previousOwnHashes = previous.ownHashes
+        self.previousParentIds = previous.store.parentIds
+        self.previousRenderResults = previous.renderResults
+        self.previousNumbers = previous.renderedNumbers
+        self.numbers = previous.numbers
+        if store.tag_name(0) != previous_store.tag_name(0):
+            return
+        pairs = [(0, 0)]
+        while pairs:
+            node_id, previous_id = pairs.pop()
+            if hashes[node_id] == previous_hashes[previous_id]:
+                # Identical subtrees have the same shape, pair them node by node
+                stack = [(node_id, previous_id)]
+                while stack:
+                    node_id, previous_id = stack.pop()
+                    aligned[node_id] = unchanged[node_id] = previous_id
+                    stack.extend(zip(store.child_ids(node_id), previous_store.child_ids(previous_id)))
+                continue
+            aligned[node_id] = previous_id
+            by_hash = {}
+            for child_id in reversed(previous_store.child_ids(previous_id)):
+                by_hash.setdefault(previous_hashes[child_id], []).append(child_id)
+            unpaired = []
+            for child_id in store.child_ids(node_id):
+                candidates = by_hash.get(hashes[child_id])
+                if candidates:
+                    pairs.append((child_id, candidates.pop()))
+                else:
+                    unpaired.append(child_id)
+            if not unpaired:
+                continue
+            by_position = {(previous_store.tag_name(child_id), previous_store.twinIds[child_id]): child_id
+                           for candidates in by_hash.values() for child_id in candidates}
+            for child_id in unpaired:
+                previous_child = by_position.pop((store.tag_name(child_id), store.twinIds[child_id]), None)
+                if previous_child is not None:
+                    pairs.append((child_id, previous_child))
+
+    def is_valid(self, idx: int) -> bool:
+        previous_id = self.unchanged.get(idx)
+        if previous_id is not None:
+            return bool(self.previousValid[previous_id])
+        return super().is_valid(idx)
+
+    def is_changed(self, idx: int) -> bool:
+        if not self.previousOwnHashes:
+            return False
+        previous_id = self.aligned.get(idx)
+        return previous_id is None or self.ownHashes[idx] != self.previousOwnHashes[previous_id]
+
+    def labelled_node(self, node_id: int, previous_id: int, climbed: int) -> int:
+        """nodeId the previous label came from, or -1 if a node on the way has changed.
+        Parents of paired nodes are paired, so both parent chains are walked together."""
+        own_hashes, previous_own_hashes = self.ownHashes, self.previousOwnHashes
+        parent_ids, previous_parent_ids = self.store.parentIds, self.previousParentIds
+        while own_hashes[node_id] == previous_own_hashes[previous_id]:
+            if climbed == 0:
+                return node_id
+            node_id, previous_id = parent_ids[node_id], previous_parent_ids[previous_id]
+            climbed -= 1
+        return -1
+
+    def classify_nodes(self) -> list:
+        # Paired nodes mostly reuse their previous labels, the rest are labelled as they render
+        if self.aligned:
+            return self.renderedLabels
+        return super().classify_nodes()
+
+    def render_element(self, node: ElementNodeView) -> (str, int, str):  # type: ignore
+        store = self.store
+        node_id = node.nodeId
+        previous_id = self.aligned.get(node_id)
+        if previous_id is not None:
+            result = self.previousRenderResults.get(previous_id)
+            if result is not None:
+                tag_name, climbed, content_text = result
+                tag_idx = self.labelled_node(node_id, previous_id, climbed)
+                if tag_idx != -1:
+                    self.renderResults[node_id] = result
+                    return tag_name, tag_idx, content_text
+        tag_name, tag_idx, content_text = super().render_element(node)
+        self.renderResults[node_id] = (tag_name, store.depths[node_id] - store.depths[tag_idx], content_text)
+        return tag_name, tag_idx, content_text
+
+    def element_number(self, node_id: int, last_number: int) -> int:
+        number = self.previousNumbers.get(self.aligned.get(node_id))
+        if number is None:
+            number = next(self.numbers)
+        self.renderedNumbers[node_id] = number
+        return number
+
+    def reserve_number(self) -> int:
+        # Taken from the element counter, which the next tree continues
+        return next(self.numbers)
+
+
+__all__ = [
+    "IncrementalHTMLTree"
+]
@@ -0,0 +1,117 @@
+import re
+
+from .node_store import NodeStore
+
+WORD = re.compile(r"\w+")
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase text with runs of whitespace collapsed to one space"""
+    return " ".join(text.split()).lower()
+
+
+class NodeIndex:
+    """Inverted indexes over the nodes of a NodeStore.
+
+    Postings are nodeId lists in ascending order, keyed by tag, class token,
+    normalized text and (attribute, normalized value), which covers role and
+    id. Text is also indexed by word, so text_contains only checks the nodes
+    sharing the words of the query instead of every node.
+    """
+
+    def __init__(self, store: NodeStore):
+        self.store = store
+        self.tags: dict = {}            # tagId -> nodeIds
+        self.classes: dict = {}
+        self.texts: dict = {}
+        self.words: dict = {}
+        self.attributes: dict = {}      # (name, value) -> nodeIds
+        self.normalizedTexts: dict = {}     # nodeId -> normalized text, for nodes with text
+        tags, classes = self.tags, self.classes
+        texts, words, attributes = self.texts, self.words, self.attributes
+        normalized_texts = self.normalizedTexts
+        for node_id, raw_node in enumerate(store.rawNodes):
+            tags.setdefault(store.tagIds[node_id], []).append(node_id)
+            for name, value in raw_node.attrib.items():
+                value = normalize_text(value)
+                attributes.setdefault((name, value), []).append(node_id)
+                if name == "class":
+                    for class_name in set(value.split()):
+                        classes.setdefault(class_name, []).append(node_id)
+            if raw_node.text:
+                text = normalize_text(raw_node.text)
+                if text:
+                    normalized_texts[node_id] = text
+                    texts.setdefault(text, []).append(node_id)
+                    for word in set(WORD.findall(text)):
+                        words.setdefault(word, []).append(node_id)
+
+    def word_candidates(self, word: str, whole: bool) -> set:
+        words = self.words
+        if whole:
+            return set(words.get(word, ()))
+        candidates = set()
+        for indexed_word, node_ids in words.items():
+            if word in indexed_word:
+                candidates.update(node_ids)
+        return candidates
+
+    def text_candidates(self, text: str) -> set:
+        """nodeIds whose text may contain the normalized text, checked by the caller.
+        Every word of text lies inside a word of a matching node, and the words
+        between the first and the last are whole words."""
+        query_words = WORD.findall(text)
+        if not query_words:
+            return set(self.normalizedTexts)
+        if len(query_words) > 2:
+            words = self.words
+            return self.word_candidates(min(query_words[1:-1], key=lambda word: len(words.get(word, ()))), True)
+        candidates = self.word_candidates(query_words[0], False)
+        if len(query_words) == 2:
+            candidates &= self.word_candidates(query_words[1], False)
+        return candidates
+
+    def find(self, tag: str = None, role: str = None, element_id: str = None, class_name: str = None,
+             text: str = None, text_contains: str = None, attributes: dict = None) -> list:
+        """nodeIds matching every given criterion, in ascending order.
+        Text and attribute values are compared normalized, see normalize_text."""
+        postings = []
+        if tag is not None:
+            postings.append(self.tags.get(self.store.tagTable.get(tag.lower()), ()))
+        attribute_values = dict(attributes or {})
+        if role is not None:
+            attribute_values["role"] = role
+        if element_id is not None:
+            attribute_values["id"] = element_id
+        for name, value in attribute_values.items():
+            postings.append(self.attributes.get((name, normalize_text(value)), ()))
+        if class_name is not None:
+            postings.append(self.classes.get(class_name.lower(), ()))
+        if text is not None:
+            postings.append(self.texts.get(normalize_text(text), ()))
+        if text_contains is None:
+            if not postings:
+                return list(range(len(self.store)))
+            if len(postings) == 1:
+                return list(postings[0])
+        postings.sort(key=len)
+        if postings:
+            node_ids = set(postings[0])
+            for posting in postings[1:]:
+                node_ids.intersection_update(posting)
+        if text_contains is not None:
+            text_contains = normalize_text(text_contains)
+            # Scanning the vocabulary only pays off when the other postings are longer
+            if not postings or len(node_ids) > len(self.words):
+                candidates = self.text_candidates(text_contains)
+                node_ids = candidates if not postings else node_ids & candidates
+            normalized_texts = self.normalizedTexts
+            node_ids = [node_id for node_id in node_ids
+                        if text_contains in normalized_texts.get(node_id, "")]
+        return sorted(node_ids)
+
+
+__all__ = [
+    "NodeIndex",
+    "normalize_text"
+]
@@ -0,0 +1,206 @@
+from array import array
+import copy
+
+from lxml.html import etree
+
+
+class NodeStore:
+    """Struct-of-arrays storage for the nodes of an HTMLTree.
+
+    Nodes are numbered breadth-first, so the children of every node form a
+    contiguous id range. childOffsets is therefore the row index of a CSR
+    adjacency whose column array is the identity: the children of node i are
+    range(childOffsets[i], childOffsets[i + 1]).
+    """
+
+    def __init__(self):
+        self.rawNodes: list = []                 # lxml node of each nodeId
+        self.parentIds = array("i")             # -1 for the root
+        self.depths = array("i")
+        self.siblingIds = array("i")            # 1-based position among siblings
+        self.twinIds = array("i")               # 1-based position among same-tag siblings
+        self.tagIds = array("i")                # index into tagNames
+        self.childOffsets = array("i")
+        self.tagNames: list = []                # interned tag table
+        self.tagTable: dict = {}
+        self.detached = bytearray()             # removed from the tree by pruning
+        self.bounds = array("d")                # x, y, width, height per node, only for DOM snapshots
+        self.styleHidden = bytearray()          # visibility: hidden or opacity: 0, only for DOM snapshots
+        self.htmlContents: dict = {}            # lazily serialized subtrees
+        self.fullHtmlContents: dict = {}        # same, with the nodes pruning removed
+
+    def __len__(self) -> int:
+        return len(self.rawNodes)
+
+    def intern_tag(self, tag) -> int:
+        tag_id = self.tagTable.get(tag)
+        if tag_id is None:
+            tag_id = len(self.tagNames)
+            self.tagTable[tag] = tag_id
+            self.tagNames.append(tag)
+        return tag_id
+
+    def ingest(self, root) -> None:
+        """Number and link every node under root in a single breadth-first pass"""
+        raw_nodes = self.rawNodes = [root]
+        parent_ids, depths = self.parentIds, self.depths
+        sibling_ids, twin_ids = self.siblingIds, self.twinIds
+        tag_ids, child_offsets = self.tagIds, self.childOffsets
+        parent_ids.append(-1)
+        depths.append(1)
+        sibling_ids.append(0)
+        twin_ids.append(0)
+        tag_ids.append(self.intern_tag(root.tag))
+        node_id = 0
+        while node_id < len(raw_nodes):
+            node = raw_nodes[node_id]
+            child_offsets.append(len(raw_nodes))
+            child_depth = depths[node_id] + 1
+            tag_st = {}
+            sibling_id = 1
+            for child in node:
+                tag_id = self.intern_tag(child.tag)
+                tag_st[tag_id] = tag_st.get(tag_id, 0) + 1
+                parent_ids.append(node_id)
+                depths.append(child_depth)
+                sibling_ids.append(sibling_id)
+                twin_ids.append(tag_st[tag_id])
+                tag_ids.append(tag_id)
+                raw_nodes.append(child)
+                sibling_id += 1
+            node_id += 1
+        child_offsets.append(len(raw_nodes))
+        self.detached = bytearray(len(raw_nodes))
+
+    def has_layout(self) -> bool:
+        return len(self.bounds) > 0
+
+    def child_ids(self, idx: int) -> range:
+        return range(self.childOffsets[idx], self.childOffsets[idx + 1])
+
+    def tag_name(self, idx: int):
+        return self.tagNames[self.tagIds[idx]]
+
+    def html_contents(self, idx: int) -> str:
+        html_contents = self.htmlContents.get(idx)
+        if html_contents is None:
+            html_contents = etree.tostring(
+                self.rawNodes[idx], pretty_print=True).decode()
+            self.htmlContents[idx] = html_contents
+        return html_contents
+
+    def unpruned_node(self, idx: int):
+        """Copy of the lxml node with its subtree as it was before pruning"""
+        raw_node = self.rawNodes[idx]
+        if not isinstance(raw_node.tag, str):
+            # Comments and processing instructions have no children
+            return copy.copy(raw_node)
+        node = raw_node.makeelement(raw_node.tag, raw_node.attrib)
+        node.text, node.tail = raw_node.text, raw_node.tail
+        for child_id in self.child_ids(idx):
+            node.append(self.unpruned_node(child_id))
+        return node
+
+    def full_html_contents(self, idx: int) -> str:
+        """Serialized subtree of the node including pruned descendants, like before pruning"""
+        html_contents = self.fullHtmlContents.get(idx)
+        if html_contents is None:
+            html_contents = etree.tostring(
+                self.unpruned_node(idx), pretty_print=True).decode()
+            self.fullHtmlContents[idx] = html_contents
+        return html_contents
+
+    def invalidate(self, idx: int) -> None:
+        self.htmlContents.pop(idx, None)
+        self.fullHtmlContents.pop(idx, None)
+
+
+class ElementNodeView:
+    """Read-only ElementNode mapping over one row of a NodeStore.
+
+    The pruned view only lists children that are still attached and reports
+    empty htmlContents for nodes removed by pruning. The full view serializes
+    the whole subtree, pruned nodes included.
+    """
+    __slots__ = ("store", "nodeId", "pruned")
+
+    def __init__(self, store: NodeStore, nodeId: int, pruned: bool = False):
+        self.store = store
+        self.nodeId = nodeId
+        self.pruned = pruned
+
+    def __getitem__(self, key):
+        store, idx = self.store, self.nodeId
+        if key == "tagName":
+            return store.tagNames[store.tagIds[idx]]
+        elif key == "attributes":
+            return store.rawNodes[idx].attrib
+        elif key == "nodeId":
+            return idx
+        elif key == "text":
+            return store.rawNodes[idx].text
+        elif key == "parentId":
+            return store.parentIds[idx]
+        elif key == "depth":
+            return store.depths[idx]
+        elif key == "childIds":
+            if self.pruned:
+                return [child_id for child_id in store.child_ids(idx)
+                        if not store.detached[child_id]]
+            return list(store.child_ids(idx))
+        elif key == "siblingId":
+            return store.siblingIds[idx]
+        elif key == "twinId":
+            return store.twinIds[idx]
+        elif key == "htmlContents":
+            if not self.pruned:
+                return store.full_html_contents(idx)
+            if store.detached[idx]:
+                return ""
+            return store.html_contents(idx)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key) -> bool:
+        return key in ElementNodeView.keys()
+
+    @staticmethod
+    def keys() -> tuple:
+        return ("nodeId", "childIds", "siblingId", "twinId", "tagName",
+                "attributes", "text", "parentId", "htmlContents", "depth")
+
+    def __repr__(self) -> str:
+        return f"ElementNodeView(nodeId={self.nodeId}, tagName={self['tagName']!r})"
+
+
+class ElementNodeList:
+    """Sequence of ElementNodeView, indexed by nodeId"""
+    __slots__ = ("store", "pruned")
+
+    def __init__(self, store: NodeStore, pruned: bool = False):
+        self.store = store
+        self.pruned = pruned
+
+    def __getitem__(self, idx: int) -> ElementNodeView:
+        if not 0 <= idx < len(self.store):
+            raise IndexError(f"nodeId {idx} out of range")
+        return ElementNodeView(self.store, idx, self.pruned)
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __iter__(self):
+        for idx in range(len(self.store)):
+            yield ElementNodeView(self.store, idx, self.pruned)
+
+
+__all__ = [
+    "NodeStore",
+    "ElementNodeView",
+    "ElementNodeList"
+]
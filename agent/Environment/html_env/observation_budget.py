@@ -0,0 +1,121 @@
+import math
+import re
+
+from .build_tree import HTMLTree
+
+# Same ratio as agent.LLM.token_utils.estimate_tokens
+CHARS_PER_TOKEN = 4.8
+# Rank of each rendered label, form controls before links and list items
+LABEL_WEIGHTS = {
+    "input": 3.0, "textarea": 3.0, "search-box": 3.0, "select": 3.0,
+    "button": 2.5, "checkbox": 2.5, "radio": 2.5, "switch": 2.5,
+    "link": 2.0, "datalist": 1.5
+}
+TASK_OVERLAP_WEIGHT = 4.0
+VIEWPORT_WEIGHT = 2.0
+CHANGED_WEIGHT = 2.0
+ELISION_LINE = "{indent}... {count} elements omitted\n"
+# Upper bound for one elision line, reserved with every kept line
+ELISION_TOKENS = 8
+WORD = re.compile(r"\w{3,}|\d+")
+
+
+def estimate_tokens(text: str) -> int:
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+def viewport_scores(tree: HTMLTree, node_ids: list, viewport_size: dict = None) -> list:
+    """Closeness of each element to the viewport, by layout when the tree has
+    one and by document order otherwise"""
+    store = tree.store
+    if not store.has_layout() or not viewport_size:
+        count = max(len(node_ids), 1)
+        return [VIEWPORT_WEIGHT * (1 - index / count) for index in range(len(node_ids))]
+    top = tree.scrollOffset[1]
+    height = viewport_size["height"]
+    scores = []
+    for node_id in node_ids:
+        y, box_height = store.bounds[4 * node_id + 1], store.bounds[4 * node_id + 3]
+        if box_height <= 0:
+            scores.append(0.0)
+            continue
+        distance = max(top - (y + box_height), y - (top + height), 0)
+        scores.append(VIEWPORT_WEIGHT / (1 + distance / height))
+    return scores
+
+
+def render_within_budget(tree: HTMLTree, max_tokens: int, task: str = "",
+                         viewport_size: dict = None, elements: list = None) -> (str, dict):  # type: ignore
+    """Render the accessibility tree within max_tokens estimated tokens.
+
+    Every line is scored by its label, its word overlap with the task, its
+    distance to the viewport and whether it changed since the previous
+    observation. The best lines are kept in document order and each run of
+    dropped lines becomes one elision line. nodeDict still covers every element.
+    elements restricts the candidates to a subset of tree.rendered_elements().
+    """
+    if elements is None:
+        elements = tree.rendered_elements()
+        full_text = tree.build_dom_tree()
+    else:
+        full_text = "".join(line for _, _, line in elements)
+    full_tokens = estimate_tokens(full_text)
+    stats = {"elements": len(elements), "kept_elements": len(elements),
+             "full_tokens": full_tokens, "tokens": full_tokens, "saved_tokens": 0}
+    if max_tokens <= 0 or full_tokens <= max_tokens:
+        return full_text, stats
+
+    # Words of the rendered content, without indentation, number and label
+    element_words = [set(WORD.findall(line[line.index(" '") + 2:-2].lower()))
+                     for _, _, line in elements]
+    task_weights = {}
+    for word in set(WORD.findall(task.lower())):
+        frequency = sum(1 for words in element_words if word in words)
+        if frequency:
+            # Rare words such as a product name say more than common ones
+            task_weights[word] = math.log(1 + len(elements) / frequency)
+    total_weight = sum(task_weights.values())
+    node_ids = [node_id for node_id, _, _ in elements]
+    scores = viewport_scores(tree, node_ids, viewport_size)
+    for index, (node_id, tag_name, _) in enumerate(elements):
+        score = LABEL_WEIGHTS.get(tag_name, 1.0)
+        if total_weight:
+            score += TASK_OVERLAP_WEIGHT * sum(weight for word, weight in task_weights.items()
+                                               if word in element_words[index]) / total_weight
+        if tree.is_changed(node_id):
+            score += CHANGED_WEIGHT
+        scores[index] += score
+
+    kept = bytearray(len(elements))
+    used = ELISION_TOKENS
+    for index in sorted(range(len(elements)), key=scores.__getitem__, reverse=True):
+        cost = estimate_tokens(elements[index][2]) + ELISION_TOKENS
+        if used + cost <= max_tokens:
+            kept[index] = True
+            used += cost
+
+    lines = []
+    elided = 0
+    elided_indent = ""
+    for index, (_, _, line) in enumerate(elements):
+        if kept[index]:
+            if elided:
+                lines.append(ELISION_LINE.format(indent=elided_indent, count=elided))
+                elided = 0
+            lines.append(line)
+        else:
+            if not elided:
+                elided_indent = line[:len(line) - len(line.lstrip(" "))]
+            elided += 1
+    if elided:
+        lines.append(ELISION_LINE.format(indent=elided_indent, count=elided))
+    text = "".join(lines)
+    tokens = estimate_tokens(text)
+    stats.update({"kept_elements": sum(kept), "tokens": tokens, "saved_tokens": full_tokens - tokens})
+    return text, stats
+
+
+__all__ = [
+    "estimate_tokens",
+    "render_within_budget"
+]
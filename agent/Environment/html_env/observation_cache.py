@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from hashlib import blake2b
+
+from .build_tree import HTMLTree
+
+
+class ObservationCache:
+    """LRU cache of built HTMLTrees keyed by a hash of the page html and its url.
+
+    A cached tree keeps nodeDict, element_value and the rendered accessibility
+    tree, so a hit restores the whole observation without parsing again.
+    A max_size of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(html_content: str, url: str) -> bytes:
+        digest = blake2b(html_content.encode("utf-8", "surrogatepass"), digest_size=16)
+        digest.update(b"\0")
+        digest.update(url.encode("utf-8", "surrogatepass"))
+        return digest.digest()
+
+    def get(self, key: bytes):
+        tree = self.entries.get(key)
+        if tree is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return tree
+
+    def put(self, key: bytes, tree: HTMLTree) -> None:
+        if self.max_size <= 0:
+            return
+        self.entries[key] = tree
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+__all__ = [
+    "ObservationCache"
+]
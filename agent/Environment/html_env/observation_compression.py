@@ -0,0 +1,115 @@
+from .build_tree import HTMLTree
+from .observation_budget import estimate_tokens
+
+GROUP_LINE = "{indent}[{num}] group '{count} more {name} like the above, expand to see them'\n"
+
+
+def group_key(tree: HTMLTree, parent_id: int, signature: tuple) -> str:
+    """Key of a repeated group that stays the same across observations of a page"""
+    tag_name, role, class_name = signature
+    return f"{tree.get_xpath(parent_id)}|{tag_name}|{role or ''}|{class_name or ''}"
+
+
+def repeated_items(tree: HTMLTree, min_repeats: int) -> dict:
+    """nodeId of every item of a repeated sibling pattern -> (parentId, signature).
+    Siblings repeat when they share tag, role and class."""
+    store = tree.store
+    raw_nodes, valid = store.rawNodes, tree.valid
+    items = {}
+    for parent_id in range(tree.nodeCounts):
+        if not valid[parent_id]:
+            continue
+        child_ids = store.child_ids(parent_id)
+        if len(child_ids) < min_repeats:
+            continue
+        groups = {}
+        for child_id in child_ids:
+            if valid[child_id]:
+                attributes = raw_nodes[child_id].attrib
+                signature = (store.tag_name(child_id), attributes.get("role"), attributes.get("class"))
+                groups.setdefault(signature, []).append(child_id)
+        for signature, group in groups.items():
+            if len(group) >= min_repeats:
+                for child_id in group:
+                    items[child_id] = (parent_id, signature)
+    return items
+
+
+def compress_elements(tree: HTMLTree, elements: list, expanded: set = frozenset(),
+                      min_repeats: int = 6, representatives: int = 3) -> (list, dict):  # type: ignore
+    """Collapse repeated sibling patterns in rendered elements.
+
+    Lines are assigned to the outermost repeated item containing them. For
+    every group with more than representatives + 1 items the first
+    representatives items are kept and the others become one group line. The
+    group line is numbered like an element and maps to the parent node in
+    nodeDict, so the planner can expand it, expanded holds the group_key of
+    groups to leave whole. Group numbers come from tree.reserve_number, so
+    they never stand for an element of a later observation.
+    """
+    tokens_before = estimate_tokens("".join(line for _, _, line in elements))
+    stats = {"groups": 0, "collapsed_elements": 0, "tokens_before_compression": tokens_before,
+             "compression_tokens_saved": 0, "compression_ratio": 1.0}
+    items = repeated_items(tree, min_repeats)
+    if not items:
+        return elements, stats
+    parent_ids = tree.store.parentIds
+    # Item of every line, and the items of every group in document order
+    line_items = []
+    group_items = {}
+    for node_id, _, _ in elements:
+        item_id = -1
+        ancestor_id = node_id
+        while ancestor_id != -1:
+            if ancestor_id in items:
+                item_id = ancestor_id
+            ancestor_id = parent_ids[ancestor_id]
+        line_items.append(item_id)
+        if item_id != -1:
+            group = group_items.setdefault(items[item_id], [])
+            if not group or group[-1] != item_id:
+                group.append(item_id)
+
+    collapsed = {}
+    for group, item_ids in group_items.items():
+        if len(item_ids) <= representatives + 1 or group_key(tree, *group) in expanded:
+            continue
+        for item_id in item_ids[representatives:]:
+            collapsed[item_id] = group
+    if not collapsed:
+        return elements, stats
+
+    # Indented like the items, one level below the parent, see iter_rendered_elements
+    depths = tree.store.depths
+    compressed = []
+    shown_groups = set()
+    for (node_id, tag_name, line), item_id in zip(elements, line_items):
+        group = collapsed.get(item_id)
+        if group is None:
+            compressed.append((node_id, tag_name, line))
+            continue
+        stats["collapsed_elements"] += 1
+        if group in shown_groups:
+            continue
+        shown_groups.add(group)
+        parent_id, signature = group
+        key = group_key(tree, parent_id, signature)
+        name = signature[0] + "".join("." + class_name for class_name in (signature[2] or "").split())
+        count = len(group_items[group]) - representatives
+        num = tree.groupNumbers.get(key)
+        if num is None:
+            num = tree.groupNumbers[key] = tree.reserve_number()
+            tree.nodeDict[num] = parent_id
+        tree.groupValues.setdefault(parent_id, f"{count} more {name}")
+        compressed.append((parent_id, "group", GROUP_LINE.format(
+            indent="  " * depths[parent_id], num=num, count=count, name=name)))
+    tokens = estimate_tokens("".join(line for _, _, line in compressed))
+    stats.update({"groups": len(shown_groups), "compression_tokens_saved": tokens_before - tokens,
+                  "compression_ratio": round(tokens / tokens_before, 3) if tokens_before else 1.0})
+    return compressed, stats
+
+
+__all__ = [
+    "compress_elements",
+    "group_key"
+]
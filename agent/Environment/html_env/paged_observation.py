@@ -0,0 +1,80 @@
+from array import array
+
+from .build_tree import HTMLTree
+
+ABOVE_LINE = "... {count} elements above, scroll up to see them\n"
+BELOW_LINE = "... {count} elements below, scroll down to see them\n"
+
+
+class PagedObservation:
+    """Layout index of one extracted page, observed one viewport at a time.
+
+    Every rendered element is indexed by the vertical extent of its layout box,
+    or of its closest ancestor with a box for options and other nodes without
+    one, so scrolling only moves the window over the index.
+    """
+
+    def __init__(self, tree: HTMLTree, viewport_height: float, content_height: float = 0,
+                 scroll_y: float = 0):
+        store = tree.store
+        bounds, parent_ids = store.bounds, store.parentIds
+        self.tree = tree
+        self.elements = tree.rendered_elements()
+        self.tops = array("d")
+        self.bottoms = array("d")
+        for node_id, _, _ in self.elements:
+            while bounds[4 * node_id + 3] <= 0 and parent_ids[node_id] != -1:
+                node_id = parent_ids[node_id]
+            top = bounds[4 * node_id + 1]
+            self.tops.append(top)
+            self.bottoms.append(top + bounds[4 * node_id + 3])
+        self.viewportHeight = viewport_height
+        self.contentHeight = max(content_height, max(self.bottoms, default=0))
+        self.scrollY = 0
+        self.scroll_to(scroll_y)
+
+    def scroll_to(self, y: float) -> float:
+        self.scrollY = max(0, min(y, self.contentHeight - self.viewportHeight))
+        # Viewport ranking reads the scroll offset from the tree
+        self.tree.scrollOffset = (self.tree.scrollOffset[0], self.scrollY)
+        return self.scrollY
+
+    def scroll_down(self) -> float:
+        """Same steps as AsyncHTMLEnvironment.scroll_down, from the cached layout"""
+        remaining_height = self.contentHeight - self.scrollY - self.viewportHeight
+        if remaining_height <= self.viewportHeight:
+            return self.scroll_to(self.contentHeight)
+        return self.scroll_to(self.scrollY + self.viewportHeight * 0.75)
+
+    def scroll_up(self) -> float:
+        if self.scrollY < self.viewportHeight:
+            return self.scroll_to(0)
+        return self.scroll_to(self.scrollY - self.viewportHeight / 2)
+
+    def page_elements(self) -> (list, int, int):  # type: ignore
+        """Elements intersecting the viewport, and how many lie above and below it"""
+        top, bottom = self.scrollY, self.scrollY + self.viewportHeight
+        elements = []
+        above = below = 0
+        for index, element in enumerate(self.elements):
+            if self.bottoms[index] <= top:
+                above += 1
+            elif self.tops[index] >= bottom:
+                below += 1
+            else:
+                elements.append(element)
+        return elements, above, below
+
+    @staticmethod
+    def frame(text: str, above: int, below: int) -> str:
+        """Add the counts of elements outside the viewport around a rendered page"""
+        if above:
+            text = ABOVE_LINE.format(count=above) + text
+        if below:
+            text += BELOW_LINE.format(count=below)
+        return text
+
+
+__all__ = [
+    "PagedObservation"
+]
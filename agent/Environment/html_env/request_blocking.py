@@ -0,0 +1,90 @@
+from collections import Counter
+from urllib.parse import urlparse
+
+from playwright.async_api import BrowserContext, Route, Response
+
+# Resource types the planner never sees in DOM-only modes, see Request.resource_type
+BLOCKED_RESOURCE_TYPES = ("image", "media", "font")
+
+# Analytics, ad and session-recording hosts, subdomains are blocked too
+TRACKER_HOSTS = (
+    "google-analytics.com", "googletagmanager.com", "googlesyndication.com", "googleadservices.com",
+    "doubleclick.net", "adservice.google.com", "connect.facebook.net", "analytics.twitter.com",
+    "bat.bing.com", "clarity.ms", "hotjar.com", "mixpanel.com", "segment.com", "segment.io",
+    "amplitude.com", "fullstory.com", "newrelic.com", "nr-data.net", "scorecardresearch.com",
+    "quantserve.com", "criteo.com", "criteo.net", "taboola.com", "outbrain.com", "adnxs.com",
+    "amazon-adsystem.com", "moatads.com", "pubmatic.com", "rubiconproject.com", "optimizely.com"
+)
+
+# Observation modes that send screenshots to a model, which need images and fonts
+VISUAL_MODES = ("d_v", "dom_v_desc", "vision_to_dom", "vision")
+
+
+class RequestBlocker:
+    """context.route policy that aborts requests for some resource types and tracker hosts.
+
+    Counts blocked requests by resource type, with "tracker" for tracker hosts,
+    and the bytes of the responses that did load, from their Content-Length.
+    Aborted requests transfer nothing, so their size is unknown, and the saving
+    is the difference in loaded bytes with and without blocking.
+    """
+
+    def __init__(self, resource_types=BLOCKED_RESOURCE_TYPES, tracker_hosts=TRACKER_HOSTS):
+        self.resourceTypes = frozenset(resource_types)
+        self.trackerHosts = frozenset(tracker_hosts)
+        self.blocked = Counter()
+        self.loadedRequests = 0
+        self.loadedBytes = 0
+
+    def is_tracker(self, url: str) -> bool:
+        host = urlparse(url).hostname or ""
+        tracker_hosts = self.trackerHosts
+        while host:
+            if host in tracker_hosts:
+                return True
+            _, _, host = host.partition(".")
+        return False
+
+    def block_reason(self, resource_type: str, url: str) -> str:
+        """Why a request is blocked, None when it may load"""
+        if resource_type in self.resourceTypes:
+            return resource_type
+        if self.trackerHosts and self.is_tracker(url):
+            return "tracker"
+        return None
+
+    async def install(self, context: BrowserContext) -> None:
+        await context.route("**/*", self.handle)
+        context.on("response", self.count_response)
+
+    async def handle(self, route: Route) -> None:
+        request = route.request
+        reason = self.block_reason(request.resource_type, request.url)
+        if reason is None:
+            # The next route of the context, or the network when there is none
+            await route.fallback()
+        else:
+            self.blocked[reason] += 1
+            await route.abort("blockedbyclient")
+
+    def count_response(self, response: Response) -> None:
+        self.loadedRequests += 1
+        length = response.headers.get("content-length", "")
+        if length.isdigit():
+            self.loadedBytes += int(length)
+
+    def stats(self) -> dict:
+        return {
+            "blocked_requests": sum(self.blocked.values()),
+            "blocked_by_type": dict(self.blocked),
+            "loaded_requests": self.loadedRequests,
+            "loaded_bytes": self.loadedBytes
+        }
+
+
+__all__ = [
+    "BLOCKED_RESOURCE_TYPES",
+    "TRACKER_HOSTS",
+    "VISUAL_MODES",
+    "RequestBlocker"
+]
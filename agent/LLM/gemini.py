@@ -31,9 +31,9 @@ def process_messages(messages: list[dict]) -> list[dict]:
                 if content_part['type'] == 'text':
                     parts.append(content_part['text'])
                 elif content_part['type'] == 'image_url':
-                    base64_image = (content_part['image_url']['url']
-                                    .split(',')[1])
-                    parts.append({'mime_type': 'image/jpeg',
+                    # A data url, data:<mime type>;base64,<data>
+                    header, base64_image = content_part['image_url']['url'].split(',', 1)
+                    parts.append({'mime_type': header[len('data:'):].split(';')[0],
                                   'data': base64_image})
         processed_message = {'role': role, 'parts': parts}
         processed_messages.append(processed_message)
@@ -9,20 +9,22 @@ from logs import logger
 
 
 class InteractionMode:
-    def __init__(self, text_model=None, visual_model=None):
+    def __init__(self, text_model=None, visual_model=None, expand_tool=False):
         self.text_model = text_model
         self.visual_model = visual_model
+        # Observations are compressed, so the planning prompt lists the expand tool
+        self.expand_tool = expand_tool
 
     def execute(self, status_description, user_request, previous_trace, observation, feedback, observation_VforD):
         pass
 
 
 class DomMode(InteractionMode):
-    def __init__(self, text_model=None, visual_model=None):
-        super().__init__(text_model, visual_model)
+    def __init__(self, text_model=None, visual_model=None, expand_tool=False):
+        super().__init__(text_model, visual_model, expand_tool)
 
     async def execute(self, status_description, user_request, previous_trace, observation, feedback, observation_VforD):
-        planning_request = PlanningPromptConstructor().construct(
+        planning_request = PlanningPromptConstructor(self.expand_tool).construct(
             user_request, previous_trace, observation, feedback, status_description)
         logger.info(
             f"\033[32mDOM_based_planning_request:\n{planning_request}\033[0m\n")
@@ -39,8 +41,8 @@ class DomMode(InteractionMode):
 
 
 class DomVDescMode(InteractionMode):
-    def __init__(self, text_model=None, visual_model=None):
-        super().__init__(text_model, visual_model)
+    def __init__(self, text_model=None, visual_model=None, expand_tool=False):
+        super().__init__(text_model, visual_model, expand_tool)
 
     async def execute(self, status_description, user_request, previous_trace, observation, feedback, observation_VforD):
         if observation_VforD != "":
@@ -52,7 +54,7 @@ class DomVDescMode(InteractionMode):
         else:
             vision_desc_response = ""
         print(f"\033[36mvision_disc_response:\n{vision_desc_response}")  # blue
-        planning_request = ObservationVisionDiscPromptConstructor().construct(
+        planning_request = ObservationVisionDiscPromptConstructor(self.expand_tool).construct(
             user_request, previous_trace, observation, feedback, status_description, vision_desc_response)
         print(
             f"\033[35mplanning_request:\n{print_limited_json(planning_request, limit=10000)}")
@@ -146,11 +148,11 @@ class VisionToDomMode(InteractionMode):
 
 
 class DVMode(InteractionMode):
-    def __init__(self, text_model=None, visual_model=None):
-        super().__init__(text_model, visual_model)
+    def __init__(self, text_model=None, visual_model=None, expand_tool=False):
+        super().__init__(text_model, visual_model, expand_tool)
 
     async def execute(self, status_description, user_request, previous_trace, observation, feedback, observation_VforD):
-        planning_request = D_VObservationPromptConstructor().construct(
+        planning_request = D_VObservationPromptConstructor(self.expand_tool).construct(
             user_request, previous_trace, observation, observation_VforD, feedback, status_description)
 
         print(
@@ -192,7 +194,8 @@ class Planning:
         feedback,
         mode,
         observation_VforD,
-        status_description
+        status_description,
+        compress_observation=False
     ):
 
         gpt35 = GPTGenerator(model="gpt-3.5-turbo")
@@ -204,12 +207,13 @@ class Planning:
                                            all_json_models)
 
         modes = {
-            "dom": DomMode(text_model=llm_planning),
+            "dom": DomMode(text_model=llm_planning, expand_tool=compress_observation),
             "dom_v_desc": DomVDescMode(visual_model=llm_planning,
-                                       text_model=llm_planning),
+                                       text_model=llm_planning,
+                                       expand_tool=compress_observation),
             "vision_to_dom": VisionToDomMode(visual_model=llm_planning,
                                              text_model=llm_planning),
-            "d_v": DVMode(visual_model=llm_planning),
+            "d_v": DVMode(visual_model=llm_planning, expand_tool=compress_observation),
             "vision": VisionMode(visual_model=llm_planning)
         }
 
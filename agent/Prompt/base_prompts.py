@@ -11,6 +11,10 @@ class BasePrompts:
     # - select_option: useful for when you need to select a drop-down box value. When you get (select and option) tags from the accessibility tree, you need to select the serial number(element_id) corresponding to the select tag, not the option, and select the most likely content corresponding to the option as Input.
     # - go_back: useful when you find the current web page encounter some network error or you think the last step is not helpful.
 
+    # Listed after go_back by the planning prompt constructors when observations are compressed
+    expand_tool = '''            - expand: useful when the accessibility tree shows a group of similar elements that was collapsed and you need to see all of them. Use the element_id of the group.
+'''
+
     planning_prompt_system = '''You are an assistant who not only helps to browse and operate web pages to achieve certain goals, but also needs to explore the information on the page to answer the questions raised by the target task. Please answer the following questions as much as possible.
         There are key information you will get:
         **Key Information**:
@@ -1,4 +1,4 @@
-from ..Utils.utils import is_valid_base64
+from ..Utils.utils import is_valid_base64, image_data_url
 import json5
 
 from .vision_to_dom_prompts import VisionToDomPrompts
@@ -17,10 +17,18 @@ class BasePromptConstructor:
         pass
 
 
+def with_expand_tool(prompt_system: str) -> str:
+    """Planning system prompt that lists the expand tool of compressed observations after go_back"""
+    line_end = prompt_system.index("\n", prompt_system.index("- go_back:")) + 1
+    return prompt_system[:line_end] + BasePrompts.expand_tool + prompt_system[line_end:]
+
+
 # Build a prompt for planning based on the DOM tree
 class PlanningPromptConstructor(BasePromptConstructor):
-    def __init__(self):
+    def __init__(self, expand_tool: bool = False):
         self.prompt_system = BasePrompts.planning_prompt_system
+        if expand_tool:
+            self.prompt_system = with_expand_tool(self.prompt_system)
         self.prompt_user = BasePrompts.planning_prompt_user
 
     def construct(
@@ -71,7 +79,7 @@ class VisionDisc2PromptConstructor(BasePromptConstructor):
             user_request=user_request)
         prompt_elements = [{"type": "text", "text": rendered_prompt},
                            {"type": "text", "text": "current web page screenshot is:"},
-                           {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}]
+                           {"type": "image_url", "image_url": {"url": image_data_url(base64_image)}}]
 
         # Construct the final message payload
         messages = [{"role": "system", "content": self.prompt_system},
@@ -89,7 +97,7 @@ class VisionDisc1PromptConstructor(BasePromptConstructor):
             base64_image: str
     ) -> list:
         prompt_elements = [{"type": "text", "text": "current web page screenshot is:"},
-                           {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}]
+                           {"type": "image_url", "image_url": {"url": image_data_url(base64_image)}}]
 
         # Construct the final message payload
         messages = [{"role": "system", "content": self.prompt_system},
@@ -98,9 +106,11 @@ class VisionDisc1PromptConstructor(BasePromptConstructor):
 
 
 class ObservationVisionDiscPromptConstructor(BasePromptConstructor):
-    def __init__(self):
+    def __init__(self, expand_tool: bool = False):
         super().__init__()
         self.prompt_system = DomVisionDiscPrompts.dom_vision_disc_planning_prompt_system
+        if expand_tool:
+            self.prompt_system = with_expand_tool(self.prompt_system)
         self.prompt_user = DomVisionDiscPrompts.dom_vision_disc_planning_prompt_user
 
     def construct(
@@ -173,7 +183,7 @@ class ObservationVisionActPromptConstructor(BasePromptConstructor):
                 prompt_elements.append(
                     {"type": "text", "text": "The current webpage's screenshot is:"})
                 prompt_elements.append(
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{observation_vision}"}})
+                    {"type": "image_url", "image_url": {"url": image_data_url(observation_vision)}})
         messages = [{"role": "system", "content": self.prompt_system},
                     {"role": "user", "content": prompt_elements}]
         return messages
@@ -203,9 +213,11 @@ class VisionToDomPromptConstructor(BasePromptConstructor):
 
 
 class D_VObservationPromptConstructor(BasePromptConstructor):
-    def __init__(self):
+    def __init__(self, expand_tool: bool = False):
         super().__init__()
         self.prompt_system = DomVisionPrompts.d_v_planning_prompt_system
+        if expand_tool:
+            self.prompt_system = with_expand_tool(self.prompt_system)
         self.prompt_user = DomVisionPrompts.d_v_planning_prompt_user
 
     def construct(
@@ -237,8 +249,7 @@ class D_VObservationPromptConstructor(BasePromptConstructor):
                     {"type": "text", "text": "current screenshot is:"})
                 prompt_elements.append(
                     {"type": "image_url",
-                     "image_url": {"url": f"data:image/jpeg;base64,"
-                                          f"{observation_VforD}"}})
+                     "image_url": {"url": image_data_url(observation_VforD)}})
         # Construct the final message payload
         messages = [{"role": "system", "content": self.prompt_system},
                     {"role": "user", "content": prompt_elements}]
@@ -272,7 +283,7 @@ class VisionObservationPromptConstructor(BasePromptConstructor):
             prompt_elements.append(
                 {"type": "text", "text": "The current observation is:"})
             prompt_elements.append(
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}})
+                {"type": "image_url", "image_url": {"url": image_data_url(base64_image)}})
 
         messages = [{"role": "system", "content": self.prompt_system},
                     {"role": "user", "content": prompt_elements}]
@@ -320,7 +331,7 @@ class RewardPromptConstructor(BasePromptConstructor):
                 prompt_elements.append(
                     {"type": "text", "text": "The current screenshot is:"})
                 prompt_elements.append(
-                    {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{current_info['vision_reward']}"}})
+                    {"type": "image_url", "image_url": {"url": image_data_url(current_info['vision_reward'])}})
             else:
                 prompt_elements.append(
                     {"type": "text", "text": "The current screenshot is not available."})
@@ -381,7 +392,7 @@ class VisionRewardPromptConstructor(BasePromptConstructor):
         prompt_elements.append(
             {"type": "text", "text": "the screenshot of current web page is :"})
         prompt_elements.append(
-            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{observation_VforD}"}})
+            {"type": "image_url", "image_url": {"url": image_data_url(observation_VforD)}})
 
         messages = [{"role": "system", "content": self.prompt_system},
                     {"role": "user", "content": prompt_elements}]
@@ -2,8 +2,6 @@ import json5
 import base64
 # used for save_screenshot
 import os
-from PIL import Image
-from io import BytesIO
 from datetime import datetime
 # used for download_data and upload_result
 import requests
@@ -50,6 +48,27 @@ def read_json_file(file_path):
         return f"File not found: {file_path}"
 
 
+SCREENSHOT_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp'}
+
+
+def screenshot_mime_type(screenshot_base64: str) -> str:
+    """MIME type of a base64 screenshot from its first bytes, image/jpeg unless it is png or webp"""
+    try:
+        header = base64.b64decode(screenshot_base64[:16])
+    except ValueError:
+        return 'image/jpeg'
+    if header.startswith(b'\x89PNG'):
+        return 'image/png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def image_data_url(screenshot_base64: str) -> str:
+    """Data url of a base64 screenshot labelled with its own format, for image_url prompt parts"""
+    return f"data:{screenshot_mime_type(screenshot_base64)};base64,{screenshot_base64}"
+
+
 def save_screenshot(mode: str, record_time: str, task_name: str, step_number: int, description: str,
                     screenshot_base64: str, task_name_id: str = None):
 
@@ -62,15 +81,16 @@ def save_screenshot(mode: str, record_time: str, task_name: str, step_number: in
         task_folder = f'results/screenshots/screenshots_{mode}_{record_time}/{task_name}'
     else:
         task_folder = f'results/screenshots/screenshots_{mode}_{record_time}/{task_name_id}_{task_name}'
-    if not os.path.exists(task_folder):
-        os.makedirs(task_folder)
+    os.makedirs(task_folder, exist_ok=True)
 
+    # The bytes are written as the browser encoded them, the extension follows their format
     image_data = base64.b64decode(screenshot_base64)
-    image = Image.open(BytesIO(image_data))
+    extension = SCREENSHOT_EXTENSIONS[screenshot_mime_type(screenshot_base64)]
 
-    screenshot_filename = f'{task_folder}/Step{step_number}_{timestamp}_{description}.png'
+    screenshot_filename = f'{task_folder}/Step{step_number}_{timestamp}_{description}.{extension}'
 
-    image.save(screenshot_filename)
+    with open(screenshot_filename, 'wb') as file:
+        file.write(image_data)
 
 
 def print_limited_json(obj, limit=500, indent=0):
@@ -0,0 +1,68 @@
+"""Check and time the HTML parser backends of HTMLTree.fetch_html_content.
+
+Every backend builds the tree of every page, and its build_dom_tree output,
+nodeDict and pruned html are compared with the lxml backend. A backend that
+renders any page differently fails the run with exit status 1. Backends whose
+package is missing are skipped. Throughput is reported for the parse step
+alone and for the whole fetch_html_content.
+
+Usage:
+    python benchmarks/bench_html_parsers.py --pages_dir path/to/html --repeat 10
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.build_tree import HTMLTree  # noqa: E402
+from agent.Environment.html_env.html_parsers import HTML_PARSER_BACKENDS, create_html_parser  # noqa: E402
+from benchmarks.pages import load_pages  # noqa: E402
+
+
+def observe(html_content: str, parser) -> tuple:
+    tree = HTMLTree()
+    pruned_html = tree.fetch_html_content(html_content, parser=parser)
+    return tree.build_dom_tree(), tree.nodeDict, pruned_html
+
+
+def mb_per_second(function, size: int, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return size * repeat / (time.perf_counter() - start) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages_dir", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--backends", nargs="+", default=list(HTML_PARSER_BACKENDS))
+    args = parser.parse_args()
+
+    backends = {}
+    for name in args.backends:
+        try:
+            backends[name] = create_html_parser(name)
+        except ImportError as e:
+            print(f"skipping {name}: {e}")
+    pages = load_pages(args.pages_dir)
+    failed = False
+    print(f"{'page':<24}{'backend':<12}{'parse MB/s':>12}{'fetch MB/s':>12}  output")
+    for page_name, html_content in pages.items():
+        size = len(html_content.encode("utf-8", "replace"))
+        expected = observe(html_content, create_html_parser("lxml"))
+        for name, backend in backends.items():
+            identical = observe(html_content, backend) == expected
+            failed = failed or not identical
+            parse_speed = mb_per_second(lambda: backend.parse(html_content), size, args.repeat)
+            fetch_speed = mb_per_second(lambda: HTMLTree().fetch_html_content(html_content, parser=backend),
+                                        size, args.repeat)
+            print(f"{page_name:<24}{name:<12}{parse_speed:>12.1f}{fetch_speed:>12.1f}  "
+                  f"{'identical' if identical else 'DIFFERENT'}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
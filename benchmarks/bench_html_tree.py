@@ -0,0 +1,74 @@
+"""Compare HTMLTree.fetch_html_content with the original ingestion path.
+
+Usage:
+    python benchmarks/bench_html_tree.py --pages path/to/raw_html --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.build_tree import HTMLTree  # noqa: E402
+from benchmarks.legacy_html_tree import LegacyHTMLTree  # noqa: E402
+from benchmarks.pages import load_pages  # noqa: E402
+
+
+def time_fetch(tree_cls, html_content: str, repeat: int) -> (float, str):  # type: ignore
+    timings = []
+    dom_tree = ""
+    for _ in range(repeat):
+        tree = tree_cls()
+        start = time.perf_counter()
+        tree.fetch_html_content(html_content)
+        timings.append(time.perf_counter() - start)
+        dom_tree = tree.build_dom_tree()
+    return statistics.median(timings), dom_tree
+
+
+def peak_memory(tree_cls, html_content: str) -> int:
+    """Peak Python heap held while fetching the page, lxml's C heap is not counted"""
+    tracemalloc.start()
+    tree = tree_cls()
+    tree.fetch_html_content(html_content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del tree
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=str, default=None,
+                        help="Directory of saved .html pages, synthetic pages are used if omitted.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--memory", action="store_true",
+                        help="Also report the peak Python heap per page and per node.")
+    args = parser.parse_args()
+
+    print(f"{'page':<40} {'nodes':>8} {'legacy ms':>10} {'new ms':>10} {'speedup':>8} same")
+    legacy_total = new_total = 0.0
+    for name, html_content in load_pages(args.pages).items():
+        legacy_time, legacy_dom = time_fetch(LegacyHTMLTree, html_content, args.repeat)
+        new_time, new_dom = time_fetch(HTMLTree, html_content, args.repeat)
+        node_counts = HTMLTree()
+        node_counts.fetch_html_content(html_content)
+        legacy_total += legacy_time
+        new_total += new_time
+        print(f"{name[-40:]:<40} {node_counts.nodeCounts:>8} {legacy_time * 1000:>10.1f} "
+              f"{new_time * 1000:>10.1f} {legacy_time / new_time:>7.2f}x {legacy_dom == new_dom}")
+        if args.memory:
+            legacy_peak = peak_memory(LegacyHTMLTree, html_content)
+            new_peak = peak_memory(HTMLTree, html_content)
+            print(f"{'  peak heap KiB / bytes per node':<40} {'':>8} {legacy_peak / 1024:>10.0f} "
+                  f"{new_peak / 1024:>10.0f}   legacy {legacy_peak / node_counts.nodeCounts:.0f} B, "
+                  f"new {new_peak / node_counts.nodeCounts:.0f} B")
+    print(f"{'total':<40} {'':>8} {legacy_total * 1000:>10.1f} {new_total * 1000:>10.1f} "
+          f"{legacy_total / new_total:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare HTMLTree.find with a scan over elementNodes.
+
+The scan is what callers did before the index: visit every node and test its
+tag, attributes and text. Both must return the same nodeIds. The index is
+built once per tree and its build time is reported separately.
+
+Usage:
+    python benchmarks/bench_node_index.py --pages_dir path/to/html --repeat 200
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.build_tree import HTMLTree  # noqa: E402
+from agent.Environment.html_env.node_index import normalize_text  # noqa: E402
+from benchmarks.pages import load_pages  # noqa: E402
+
+QUERIES = [
+    {"tag": "a", "text_contains": "product 4"},
+    {"role": "button", "text": "add to cart"},
+    {"class_name": "price"},
+    {"tag": "input", "attributes": {"placeholder": "search products"}},
+    {"text_contains": "free ship"},
+    {"element_id": "search-form"},
+]
+
+
+def scan(tree: HTMLTree, tag=None, role=None, element_id=None, class_name=None,
+         text=None, text_contains=None, attributes=None) -> list:
+    node_ids = []
+    for node in tree.elementNodes:
+        node_id = node["nodeId"]
+        if not tree.valid[node_id]:
+            continue
+        node_attributes = node["attributes"]
+        node_text = normalize_text(node["text"] or "")
+        if tag is not None and node["tagName"] != tag:
+            continue
+        if role is not None and normalize_text(node_attributes.get("role", "")) != role:
+            continue
+        if element_id is not None and normalize_text(node_attributes.get("id", "")) != element_id:
+            continue
+        if class_name is not None and class_name not in node_attributes.get("class", "").lower().split():
+            continue
+        if text is not None and node_text != text:
+            continue
+        if text_contains is not None and (not node_text or text_contains not in node_text):
+            continue
+        if attributes and any(normalize_text(node_attributes.get(name, "")) != value
+                              for name, value in attributes.items()):
+            continue
+        node_ids.append(node_id)
+    return node_ids
+
+
+def timed(function, repeat: int) -> (float, list):  # type: ignore
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages_dir", type=str, default=None)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'page':<24}{'nodes':>8}{'build ms':>10}{'find us':>10}{'scan us':>12}{'speedup':>10}")
+    for name, html_content in load_pages(args.pages_dir).items():
+        tree = HTMLTree()
+        tree.fetch_html_content(html_content)
+        build_time, _ = timed(tree.node_index, 1)
+        find_total = scan_total = 0.0
+        for query in QUERIES:
+            find_time, found = timed(lambda: tree.find(**query), args.repeat)
+            scan_time, scanned = timed(lambda: scan(tree, **query), max(args.repeat // 10, 1))
+            assert found == scanned, (name, query, found[:10], scanned[:10])
+            find_total += find_time
+            scan_total += scan_time
+        find_time, scan_time = find_total / len(QUERIES), scan_total / len(QUERIES)
+        print(f"{name:<24}{tree.nodeCounts:>8}{build_time * 1000:>10.2f}{find_time * 1e6:>10.1f}"
+              f"{scan_time * 1e6:>12.1f}{scan_time / max(find_time, 1e-9):>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
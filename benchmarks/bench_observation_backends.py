@@ -0,0 +1,79 @@
+"""Compare AsyncHTMLEnvironment observation backends in a real browser.
+
+For every page and backend this reports the bytes moved out of the browser and
+the time from refreshing the content to a rendered accessibility tree. The
+observation cache is disabled, so the times are for building the tree cold.
+
+Usage:
+    python benchmarks/bench_observation_backends.py --urls https://www.example.com
+    python benchmarks/bench_observation_backends.py --pages path/to/raw_html
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.async_env import AsyncHTMLEnvironment, OBSERVATION_BACKENDS  # noqa: E402
+from agent.Environment.html_env.dom_extraction import EXTRACT_CANDIDATES_JS, extraction_arguments  # noqa: E402
+from benchmarks.pages import load_pages  # noqa: E402
+
+
+async def transferred_bytes(env: AsyncHTMLEnvironment) -> int:
+    if env.observation_backend == "js":
+        nodes = await env.page.evaluate(EXTRACT_CANDIDATES_JS, extraction_arguments())
+        return len(json.dumps(nodes))
+    if env.observation_backend == "cdp_snapshot":
+        return len(json.dumps(await env.capture_dom_snapshot()))
+    return len((await env.page.content()).encode())
+
+
+async def measure(env: AsyncHTMLEnvironment, repeat: int) -> (float, int, int):  # type: ignore
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await env.refresh_html_content()
+        await env.update_tree()
+        env.tree.build_dom_tree()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), await transferred_bytes(env), len(env.tree.nodeDict)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--urls", nargs="*", default=[])
+    parser.add_argument("--pages", type=str, default=None,
+                        help="Directory of saved .html pages, synthetic pages are used if no urls are given.")
+    parser.add_argument("--backends", nargs="*", default=list(OBSERVATION_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    targets = [(url, url, None) for url in args.urls]
+    if not targets:
+        targets = [(name, "about:blank", html_content)
+                   for name, html_content in load_pages(args.pages).items()]
+
+    print(f"{'page':<40} {'backend':<14} {'ms':>9} {'KiB out':>9} {'elements':>9}")
+    for backend in args.backends:
+        # Without the observation cache every repeat parses the page again
+        env = AsyncHTMLEnvironment(observation_backend=backend, observation_cache_size=0)
+        await env.setup("about:blank")
+        try:
+            for name, url, html_content in targets:
+                if html_content is None:
+                    await env.page.goto(url, timeout=30000)
+                else:
+                    await env.page.set_content(html_content)
+                elapsed, size, elements = await measure(env, args.repeat)
+                print(f"{name[-40:]:<40} {backend:<14} {elapsed * 1000:>9.1f} "
+                      f"{size / 1024:>9.1f} {elements:>9}")
+        finally:
+            await env.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
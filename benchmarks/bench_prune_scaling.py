@@ -0,0 +1,90 @@
+"""Measure how HTMLTree.prune_tree scales with the size of the DOM.
+
+Synthetic pages from 1k to 500k nodes are parsed and ingested, then only the
+pruning step is timed. The previous pruning, which walked to the root from
+every kept node and serialized each of them, is timed on the same trees up to
+--previous_max_nodes. Time per node should stay flat for a linear pass.
+
+Usage:
+    python benchmarks/bench_prune_scaling.py --nodes 1000 10000 100000 500000
+"""
+import argparse
+import os
+import sys
+import time
+from io import StringIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lxml.html import etree  # noqa: E402
+
+from agent.Environment.html_env.build_tree import HTMLTree  # noqa: E402
+from benchmarks.pages import synthetic_page  # noqa: E402
+
+# Average node count of one synthetic result card
+NODES_PER_ITEM = 12
+
+
+def ingested_tree(html_content: str) -> HTMLTree:
+    tree = HTMLTree()
+    tree.tree = etree.parse(StringIO(html_content), etree.HTMLParser())
+    tree.ingest_html_tree(tree.tree.getroot())
+    return tree
+
+
+def previous_prune(tree: HTMLTree) -> str:
+    """prune_tree before the linear rewrite"""
+    store = tree.store
+    parent_ids, child_offsets = store.parentIds, store.childOffsets
+    result_list = []
+    stack = [0]
+    while stack:
+        node_id = stack.pop()
+        result_list.append(node_id)
+        stack.extend(range(child_offsets[node_id], child_offsets[node_id + 1]))
+    for node_id in result_list[::-1]:
+        if tree.is_valid(node_id) or tree.valid[node_id]:
+            store.invalidate(node_id)
+            store.html_contents(node_id)
+            tree.valid[node_id] = True
+            current_id = node_id
+            while parent_ids[current_id] != -1:
+                parent_id = parent_ids[current_id]
+                tree.valid[parent_id] = True
+                current_id = parent_id
+        else:
+            raw_node = store.rawNodes[node_id]
+            raw_node.getparent().remove(raw_node)
+            store.detached[node_id] = True
+            tree.valid[node_id] = False
+    return tree.pruningTreeNode[0]["htmlContents"]
+
+
+def time_prune(prune, html_content: str) -> (float, int, str):  # type: ignore
+    tree = ingested_tree(html_content)
+    start = time.perf_counter()
+    pruned_html = prune(tree)
+    return time.perf_counter() - start, tree.nodeCounts, pruned_html
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, nargs="*", default=[1000, 10000, 100000, 500000])
+    parser.add_argument("--max_wrap_depth", type=int, default=6)
+    parser.add_argument("--previous_max_nodes", type=int, default=200000)
+    args = parser.parse_args()
+
+    print(f"{'nodes':>8} {'prune ms':>10} {'ns/node':>8} {'previous ms':>12} {'ns/node':>8} same")
+    for target in args.nodes:
+        html_content = synthetic_page(max(1, target // NODES_PER_ITEM), seed=target,
+                                      max_wrap_depth=args.max_wrap_depth)
+        elapsed, node_counts, pruned_html = time_prune(HTMLTree.prune_tree, html_content)
+        row = f"{node_counts:>8} {elapsed * 1000:>10.1f} {elapsed / node_counts * 1e9:>8.0f}"
+        if node_counts <= args.previous_max_nodes:
+            previous, _, previous_html = time_prune(previous_prune, html_content)
+            row += f" {previous * 1000:>12.1f} {previous / node_counts * 1e9:>8.0f} {previous_html == pruned_html}"
+        print(row)
+
+
+if __name__ == "__main__":
+    main()
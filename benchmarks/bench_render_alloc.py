@@ -0,0 +1,70 @@
+"""Measure allocations made while rendering the accessibility tree.
+
+Each page is fetched first, then only the render step is traced. tracemalloc
+reports the peak traced heap and the number of blocks allocated and still
+alive when rendering returns, for the original build_dom_tree, the streaming
+build_dom_tree and chunked iteration.
+
+The streaming renderers have a lower peak but keep more blocks than the
+original: nodeDict and element_value hold node ids read from NodeStore
+arrays, which become new int objects, where the original reused the ints
+stored in its per-node dicts.
+
+Usage:
+    python benchmarks/bench_render_alloc.py --pages path/to/raw_html
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.build_tree import HTMLTree  # noqa: E402
+from benchmarks.legacy_html_tree import LegacyHTMLTree  # noqa: E402
+from benchmarks.pages import load_pages  # noqa: E402
+
+
+def trace_render(render) -> (float, int, int, int):  # type: ignore
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    start = time.perf_counter()
+    output = render()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename"))
+    return elapsed, peak, blocks, len(output)
+
+
+def render_chunks(tree: HTMLTree, chunk_size: int) -> list:
+    # Consume chunks the way a streaming consumer would, keeping only the sizes
+    return [len(chunk) for chunk in tree.iter_dom_tree(chunk_size=chunk_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=str, default=None,
+                        help="Directory of saved .html pages, synthetic pages are used if omitted.")
+    parser.add_argument("--chunk_size", type=int, default=4096)
+    args = parser.parse_args()
+
+    print(f"{'page':<32} {'renderer':<10} {'ms':>8} {'peak KiB':>9} {'blocks':>8}")
+    for name, html_content in load_pages(args.pages).items():
+        legacy_tree = LegacyHTMLTree()
+        legacy_tree.fetch_html_content(html_content)
+        rows = [("legacy", trace_render(legacy_tree.build_dom_tree))]
+        tree = HTMLTree()
+        tree.fetch_html_content(html_content)
+        rows.append(("stream", trace_render(tree.build_dom_tree)))
+        tree = HTMLTree()
+        tree.fetch_html_content(html_content)
+        rows.append(("chunked", trace_render(lambda: render_chunks(tree, args.chunk_size))))
+        for renderer, (elapsed, peak, blocks, _) in rows:
+            print(f"{name[-32:]:<32} {renderer:<10} {elapsed * 1000:>8.1f} {peak / 1024:>9.1f} {blocks:>8}")
+
+
+if __name__ == "__main__":
+    main()
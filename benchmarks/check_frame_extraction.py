@@ -0,0 +1,62 @@
+"""Check that HTMLTree.fetch_extracted_nodes locates elements of child frames.
+
+Frames are extracted in a fixed order, and a frame that could not be read
+drops its descendant frames. The check builds a page with a failed frame 1,
+a frame 2 inside it and a frame 3 under the page, and fails with exit status
+1 when an element does not get the selector and xpath of its own frame.
+
+Usage:
+    python benchmarks/check_frame_extraction.py
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.build_tree import FRAME_SEPARATOR, HTMLTree  # noqa: E402
+
+
+def extracted_node(tag: str, parent: int, depth: int, selector: str, xpath: str,
+                   text: str = "", attributes: dict = None) -> dict:
+    """A node in the format of EXTRACT_CANDIDATES_JS"""
+    return {"tag": tag, "attributes": attributes or {}, "parent": parent, "depth": depth,
+            "text": text, "selector": selector, "xpath": xpath}
+
+
+def frame_document(tag: str, text: str, attributes: dict = None) -> list:
+    return [
+        extracted_node("html", -1, 0, "html", "/html"),
+        extracted_node("body", 0, 1, "html > body", "/html/body"),
+        extracted_node(tag, 1, 2, f"html > body > {tag}", f"/html/body/{tag}", text, attributes),
+    ]
+
+
+def main():
+    page = frame_document("a", "Home", {"href": "/"})
+    frames = [
+        (0, "/html/body/iframe[1]", None),
+        (1, "/html/body/iframe[1]", frame_document("button", "Login")),
+        (0, "/html/body/iframe[2]", frame_document("a", "Pay", {"href": "/pay"})),
+    ]
+    tree = HTMLTree()
+    tree.fetch_extracted_nodes(page, frames)
+    expected = {
+        "Home": ("html > body > a", "/html/body/a"),
+        "Pay": ("/html/body/iframe[2]" + FRAME_SEPARATOR + "html > body > a",
+                "/html/body/iframe[2]" + FRAME_SEPARATOR + "/html/body/a"),
+    }
+    failed = False
+    for text, locators in expected.items():
+        node_ids = tree.find(text=text)
+        found = tree.get_frame_selector_and_xpath(node_ids[0]) if len(node_ids) == 1 else None
+        identical = found == locators
+        failed = failed or not identical
+        print(f"{text:<8} {'ok' if identical else 'WRONG'}  {found}")
+    if tree.find(text="Login"):
+        failed = True
+        print("Login    WRONG  the frame under a failed frame was extracted")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
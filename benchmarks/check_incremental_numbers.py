@@ -0,0 +1,60 @@
+"""Check that incremental observations never reuse a number for another element.
+
+The environment observes page A, then B with new elements, then A again,
+which the observation cache serves, then C with other new elements. Every
+number shown in C must stand for the same element it stood for in B, or not
+appear in B at all. Fails with exit status 1 otherwise.
+
+Usage:
+    python benchmarks/check_incremental_numbers.py
+"""
+import asyncio
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.Environment.html_env.async_env import AsyncHTMLEnvironment  # noqa: E402
+
+LINE = re.compile(r"\[(\d+)\] (\w+) '(.*)'")
+
+
+class StaticPage:
+    """The part of a playwright Page that update_tree reads"""
+    url = "https://shop.example.com/"
+
+
+def page_html(*buttons: str) -> str:
+    links = "".join(f"<a href='/{i}'>Link {i}</a>" for i in range(5))
+    return f"<html><body><nav>{links}</nav>" + "".join(f"<button>{b}</button>" for b in buttons) + \
+        "</body></html>"
+
+
+async def observe(env: AsyncHTMLEnvironment, html_content: str) -> dict:
+    """Number -> (label, text) of the elements shown for html_content"""
+    env.html_content = html_content
+    await env.update_tree()
+    return {int(num): (tag_name, text) for num, tag_name, text in LINE.findall(env.tree.build_dom_tree())}
+
+
+async def main():
+    env = AsyncHTMLEnvironment(incremental_observation=True)
+    env.page = StaticPage()
+    await observe(env, page_html())
+    step_b = await observe(env, page_html("Add to cart", "Wish list"))
+    await observe(env, page_html())
+    hits = env.observation_cache.hits
+    step_c = await observe(env, page_html("Checkout"))
+    reused = {num: (step_b[num], element) for num, element in step_c.items()
+              if num in step_b and step_b[num] != element}
+    for num, (in_b, in_c) in reused.items():
+        print(f"[{num}] was {in_b} in B and is {in_c} in C")
+    if hits != 1:
+        print(f"expected the second observation of A to be a cache hit, got {hits} hits")
+    print("ok" if not reused and hits == 1 else "FAILED")
+    sys.exit(1 if reused or hits != 1 else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
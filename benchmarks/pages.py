@@ -0,0 +1,56 @@
+import os
+import random
+
+
+def synthetic_page(n_items: int = 100, seed: int = 0, max_wrap_depth: int = 6) -> str:
+    """Build a retail-search-like page with n_items result cards"""
+    rnd = random.Random(seed)
+    parts = ["<!DOCTYPE html><html><head><title>Search results</title><meta charset='utf-8'>",
+             "<script>var loaded = 1 < 2;</script><style>.hidden{display:none}</style></head><body>",
+             "<!-- header -->",
+             "<nav id='main-nav' class='nav top'>"]
+    for i in range(8):
+        parts.append(f"<a href='/c/{i}' class='nav-link'>Category {i}</a>")
+    parts.append("<span role='button' aria-label='Menu'></span></nav>")
+    parts.append("<form id='search-form'><input type='text' placeholder='Search products' name='q'>"
+                 "<input type='hidden' name='t' value='1'><input type='checkbox' title='In stock'>"
+                 "<button type='submit'>Search</button>"
+                 "<select name='sort'><option>Price</option><optgroup label='More'>"
+                 "<option>Rating</option><option>Newest</option></optgroup></select></form>")
+    parts.append("<div class='results grid'>")
+    for i in range(n_items):
+        card_class = rnd.choice(["card", "card promo", "card sponsored"])
+        wrap_depth = rnd.randint(0, max_wrap_depth)
+        hidden = " style='display: none'" if rnd.random() < 0.1 else ""
+        parts.append(f"<div class='{card_class}'{hidden}>")
+        parts.append("".join(f"<div class='wrap-{d}'>" for d in range(wrap_depth)))
+        parts.append(f"<a href='/p/{i}'>Product {i}</a>"
+                     f"<span class='price'>${rnd.randint(1, 999)}.99</span>"
+                     f"<div role='button' tabindex='0'>Add to cart</div>"
+                     f"<ul><li><span>Free shipping</span></li><li>Rated {rnd.randint(1, 5)}/5</li></ul>"
+                     f"<p>Description of product {i} <b>bold</b> tail</p>")
+        parts.append("</div>" * wrap_depth)
+        parts.append("</div>")
+    parts.append("</div><table><tr role='row'><td>Total</td><td role='checkbox' aria-checked='false'></td></tr></table>")
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def load_pages(pages_dir: str = None, sizes=(50, 500, 2000)) -> dict:
+    """Load saved .html pages from pages_dir, or build synthetic pages of the given sizes.
+
+    The raw data of a downloaded challenge (see data/dataset_io.py) contains the
+    raw html of every recorded Mind2Web-Live step and can be used as pages_dir.
+    """
+    pages = {}
+    if pages_dir:
+        for dirpath, _, filenames in os.walk(pages_dir):
+            for filename in sorted(filenames):
+                if filename.endswith((".html", ".htm")):
+                    path = os.path.join(dirpath, filename)
+                    with open(path, encoding="utf-8", errors="ignore") as f:
+                        pages[os.path.relpath(path, pages_dir)] = f.read()
+    if not pages:
+        for n_items in sizes:
+            pages[f"synthetic_{n_items}"] = synthetic_page(n_items, seed=n_items)
+    return pages
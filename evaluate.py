@@ -1,4 +1,5 @@
 from agent.Environment.html_env.async_env import AsyncHTMLEnvironment
+from agent.Environment.html_env.browser_pool import BrowserPool
 from evaluate import *
 from agent.Plan import *
 from dataclasses import dataclass
@@ -6,12 +7,16 @@ from dataclasses import dataclass
 import re
 import asyncio
 import argparse
+import multiprocessing
+import queue
+import traceback
 import logging
 
 # universal tools
 from agent.Utils.utils import *
 # evaluate tools
 from evaluate.evaluate_utils import run_task, read_config, read_file
+from evaluate import evaluate_utils
 from agent.Utils.utils import read_json_file
 from experiment_results import get_evaluate_result
 
@@ -38,6 +43,25 @@ class ExperimentConfig:
     write_result_file_path: str
     record_time: str
     file: list
+    observation_backend: str = "lxml"
+    incremental_observation: bool = False
+    paged_observation: bool = False
+    compress_observation: bool = False
+    html_parser: str = "lxml"
+    observe_frames: bool = False
+    element_rules: str = ""
+    element_handles: bool = False
+    browser_pool: int = 0
+    browser_max_tasks: int = 50
+    browser_max_memory: int = 0
+    concurrency: int = 1
+    workers: int = 1
+    adaptive_settle: bool = False
+    block_resources: str = "auto"
+    har_mode: str = "off"
+    har_dir: str = "har"
+    screenshot_format: str = "jpeg"
+    screenshot_quality: int = 90
 
 
 def validate_config(config, observation_mode, global_reward_mode, observation_model, global_reward_model):
@@ -105,45 +129,94 @@ def load_ground_truth_data(config, ground_truth_mode):
     return None
 
 
-def create_html_environment(mode):
+def create_html_environment(mode, observation_backend="lxml", incremental_observation=False,
+                            paged_observation=False, compress_observation=False, html_parser="lxml",
+                            observe_frames=False, element_rules="", element_handles=False, browser_pool=None,
+                            adaptive_settle=False, block_resources="auto", har_mode="off", har_path="",
+                            screenshot_format="jpeg", screenshot_quality=90):
     return AsyncHTMLEnvironment(
         mode=mode,
         max_page_length=8192,
         headless=False,
-        slow_mo=1000,
+        # Adaptive settling replaces the fixed slowdown of every operation
+        slow_mo=0 if adaptive_settle else 1000,
         current_viewport_only=False,
         viewport_size={"width": 1080, "height": 720},
         save_trace_enabled=False,
         sleep_after_execution=0.0,
         locale="en-US",
-        use_vimium_effect=True
+        use_vimium_effect=True,
+        observation_backend=observation_backend,
+        incremental_observation=incremental_observation,
+        paged_observation=paged_observation,
+        compress_observation=compress_observation,
+        html_parser=html_parser,
+        observe_frames=observe_frames,
+        element_rules=element_rules,
+        element_handles=element_handles,
+        browser_pool=browser_pool,
+        adaptive_settle=adaptive_settle,
+        block_resources=None if block_resources == "auto" else block_resources == "on",
+        har_mode=har_mode,
+        har_path=har_path,
+        screenshot_format=screenshot_format,
+        screenshot_quality=screenshot_quality
     )
 
 
-async def run_experiment(task_range, experiment_config):
-    for task_index in task_range:
-        task_uuid = None
-        if experiment_config.config['basic']['task_mode'] == "batch_tasks":
-            task = experiment_config.file[task_index]
-            task_name, task_uuid, reference_task_length, reference_evaluate_steps = task
-            evaluate_steps = reference_evaluate_steps
-            log_task_info(task_index, task_name,
-                          reference_task_length, reference_evaluate_steps)
-        elif experiment_config.config['basic']['task_mode'] == "single_task":
-            task_name = experiment_config.single_task_name
-            reference_task_length = experiment_config.config['steps']['single_task_action_step']
-            # TODO
-            evaluate_steps = experiment_config.config['steps']['single_task_action_step']
-            reference_evaluate_steps = None
-            logger.info(f"task_name: {task_name}")
-
-        env = create_html_environment(experiment_config.mode)
-        if is_model_supported(experiment_config.planning_text_model) and is_model_supported(
-                experiment_config.global_reward_text_model):
-            if not os.path.exists("token_results"):
-                os.makedirs("token_results")
-            token_counts_filename = f"token_results/token_counts_{experiment_config.record_time}_{experiment_config.planning_text_model}_{experiment_config.global_reward_text_model}.json"
-
+def create_browser_pool(experiment_config):
+    """Warm browsers for the environments of create_html_environment, None without --browser_pool"""
+    if not experiment_config.browser_pool:
+        return None
+    # Each running task holds a browser of the pool
+    return BrowserPool(size=max(experiment_config.browser_pool, experiment_config.concurrency),
+                       headless=False, slow_mo=0 if experiment_config.adaptive_settle else 1000,
+                       max_tasks=experiment_config.browser_max_tasks,
+                       max_memory_mb=experiment_config.browser_max_memory)
+
+
+async def run_experiment_task(task_index, experiment_config, browser_pool=None):
+    task_uuid = None
+    if experiment_config.config['basic']['task_mode'] == "batch_tasks":
+        task = experiment_config.file[task_index]
+        task_name, task_uuid, reference_task_length, reference_evaluate_steps = task
+        evaluate_steps = reference_evaluate_steps
+        log_task_info(task_index, task_name,
+                      reference_task_length, reference_evaluate_steps)
+    elif experiment_config.config['basic']['task_mode'] == "single_task":
+        task_name = experiment_config.single_task_name
+        reference_task_length = experiment_config.config['steps']['single_task_action_step']
+        # TODO
+        evaluate_steps = experiment_config.config['steps']['single_task_action_step']
+        reference_evaluate_steps = None
+        logger.info(f"task_name: {task_name}")
+
+    block_resources = experiment_config.block_resources
+    if block_resources == "auto" and "vision" in experiment_config.global_reward_mode:
+        # Vision rewards screenshot the page
+        block_resources = "off"
+    har_path = ""
+    if experiment_config.har_mode != "off":
+        # One HAR per task, named like its result json
+        har_path = os.path.join(experiment_config.har_dir, f"{task_index}_{task_uuid}.har")
+        if experiment_config.har_mode == "record":
+            os.makedirs(experiment_config.har_dir, exist_ok=True)
+    env = create_html_environment(experiment_config.mode, experiment_config.observation_backend,
+                                  experiment_config.incremental_observation,
+                                  experiment_config.paged_observation,
+                                  experiment_config.compress_observation,
+                                  experiment_config.html_parser,
+                                  experiment_config.observe_frames,
+                                  experiment_config.element_rules,
+                                  experiment_config.element_handles,
+                                  browser_pool,
+                                  experiment_config.adaptive_settle,
+                                  block_resources,
+                                  experiment_config.har_mode,
+                                  har_path,
+                                  experiment_config.screenshot_format,
+                                  experiment_config.screenshot_quality)
+    try:
         await run_task(mode=experiment_config.mode,
                        task_mode=experiment_config.config['basic']['task_mode'],
                        task_name=task_name,
@@ -163,13 +236,69 @@ async def run_experiment(task_range, experiment_config):
                        task_index=task_index,
                        record_time=experiment_config.record_time,
                        token_pricing=experiment_config.config['token_pricing'])
-
+    finally:
         try:
             await env.close()
         except playwright._impl._api_types.Error as error:
             logger.error(error)
         del env
-    if is_model_supported(experiment_config.planning_text_model) and is_model_supported(experiment_config.global_reward_text_model):
+
+
+def validate_experiment_config(experiment_config):
+    if experiment_config.concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {experiment_config.concurrency}")
+    if experiment_config.workers < 1:
+        raise ValueError(f"workers must be at least 1, got {experiment_config.workers}")
+    if (experiment_config.concurrency > 1 or experiment_config.workers > 1) and \
+            experiment_config.config['steps']['interaction_mode']:
+        raise ValueError("interaction_mode waits for input after every step and needs concurrency 1 and workers 1")
+
+
+def token_counts_file(experiment_config):
+    """Token count file of the experiment, None when a model has no pricing"""
+    if not is_model_supported(experiment_config.planning_text_model) or not is_model_supported(
+            experiment_config.global_reward_text_model):
+        return None
+    os.makedirs("token_results", exist_ok=True)
+    return f"token_results/token_counts_{experiment_config.record_time}_{experiment_config.planning_text_model}_{experiment_config.global_reward_text_model}.json"
+
+
+async def run_tasks(task_indexes, experiment_config, on_task_done=None):
+    """Run tasks with at most experiment_config.concurrency at once, on_task_done gets each finished task_index.
+    A failed task is logged and does not stop the others, returns the task indexes that failed."""
+    browser_pool = create_browser_pool(experiment_config)
+    # Tasks share one event loop, so result and token files are written by one task at a time
+    semaphore = asyncio.Semaphore(experiment_config.concurrency)
+
+    async def run_bounded(task_index):
+        async with semaphore:
+            await run_experiment_task(task_index, experiment_config, browser_pool)
+        if on_task_done is not None:
+            on_task_done(task_index)
+
+    try:
+        # Every task settles before the pool closes under them
+        outcomes = await asyncio.gather(*(run_bounded(task_index) for task_index in task_indexes),
+                                        return_exceptions=True)
+    finally:
+        if browser_pool is not None:
+            await browser_pool.close()
+    failed = []
+    for task_index, outcome in zip(task_indexes, outcomes):
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            failed.append(task_index)
+            logger.error(f"-- Task {task_index} failed:\n"
+                         f"{''.join(traceback.format_exception(type(outcome), outcome, outcome.__traceback__))}")
+    if failed:
+        logger.error(f"-- {len(failed)} of {len(task_indexes)} tasks failed: {failed}")
+    return failed
+
+
+def report_experiment(experiment_config):
+    token_counts_filename = token_counts_file(experiment_config)
+    if token_counts_filename is not None:
         with open(token_counts_filename, 'r') as file:
             data = json.load(file)
         total_token_cost = data.get("total_token_cost", 0)
@@ -181,6 +310,69 @@ async def run_experiment(task_range, experiment_config):
     logger.info('\033[31mPress Enter to exit...\033[0m')
 
 
+async def run_experiment(task_range, experiment_config):
+    validate_experiment_config(experiment_config)
+    token_counts_file(experiment_config)
+    if experiment_config.workers > 1 and len(task_range) > 1:
+        await run_sharded_experiment(task_range, experiment_config)
+    else:
+        await run_tasks(task_range, experiment_config)
+    report_experiment(experiment_config)
+
+
+def run_worker(worker_number, task_indexes, experiment_config, results, token_lock):
+    """Entry point of a --workers process. Runs its shard of the tasks in its own event
+    loop and browser pool, and puts ("done", worker_number, task_index) on results after
+    each task, then ("exit", worker_number, None) or ("error", worker_number, traceback)."""
+    evaluate_utils.token_file_lock = token_lock
+    try:
+        asyncio.run(run_tasks(task_indexes, experiment_config,
+                              lambda task_index: results.put(("done", worker_number, task_index))))
+    except BaseException:
+        results.put(("error", worker_number, traceback.format_exc()))
+        raise
+    results.put(("exit", worker_number, None))
+
+
+async def run_sharded_experiment(task_range, experiment_config):
+    """Run the task range in --workers processes, task i goes to worker i % workers.
+    Workers write the same result and token files a single process would."""
+    shards = [list(task_range[worker_number::experiment_config.workers])
+              for worker_number in range(min(experiment_config.workers, len(task_range)))]
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    token_lock = context.Lock()
+    processes = [context.Process(target=run_worker, args=(worker_number, shard, experiment_config, results, token_lock))
+                 for worker_number, shard in enumerate(shards)]
+    for process in processes:
+        process.start()
+    loop = asyncio.get_running_loop()
+    running = set(range(len(processes)))
+    errors = []
+    finished = 0
+    while running:
+        try:
+            kind, worker_number, detail = await loop.run_in_executor(None, results.get, True, 5)
+        except queue.Empty:
+            # A worker that died without a message, for instance killed by the OS
+            for worker_number in list(running):
+                if not processes[worker_number].is_alive():
+                    running.discard(worker_number)
+                    errors.append(f"worker {worker_number} exited with code {processes[worker_number].exitcode}")
+            continue
+        if kind == "done":
+            finished += 1
+            logger.info(f"-- Worker {worker_number} finished task {detail} ({finished}/{len(task_range)})")
+        else:
+            running.discard(worker_number)
+            if kind == "error":
+                errors.append(f"worker {worker_number} failed:\n{detail}")
+    for process in processes:
+        process.join()
+    if errors:
+        raise RuntimeError("\n".join(errors))
+
+
 async def main(global_reward_mode="no_global_reward",
                planning_text_model="gemini-1.5-flash-002",
                global_reward_text_model="gemini-1.5-flash-002",
@@ -188,7 +380,26 @@ async def main(global_reward_mode="no_global_reward",
                raw_data_index=-1,
                observation_mode="dom",
                ground_truth_mode=False,
-               toml_path=None
+               toml_path=None,
+               observation_backend="lxml",
+               incremental_observation=False,
+               paged_observation=False,
+               compress_observation=False,
+               html_parser="lxml",
+               observe_frames=False,
+               element_rules="",
+               element_handles=False,
+               browser_pool=0,
+               browser_max_tasks=50,
+               browser_max_memory=0,
+               concurrency=1,
+               workers=1,
+               adaptive_settle=False,
+               block_resources="auto",
+               har_mode="off",
+               har_dir="har",
+               screenshot_format="jpeg",
+               screenshot_quality=90
                ):
     config = read_config(toml_path)
     validate_config(config, observation_mode, global_reward_mode, planning_text_model, global_reward_text_model)
@@ -216,7 +427,26 @@ async def main(global_reward_mode="no_global_reward",
         ground_truth_data=ground_truth_data,
         write_result_file_path=write_result_file_path,
         record_time=record_time,
-        file=file
+        file=file,
+        observation_backend=observation_backend,
+        incremental_observation=incremental_observation,
+        paged_observation=paged_observation,
+        compress_observation=compress_observation,
+        html_parser=html_parser,
+        observe_frames=observe_frames,
+        element_rules=element_rules,
+        element_handles=element_handles,
+        browser_pool=browser_pool,
+        browser_max_tasks=browser_max_tasks,
+        browser_max_memory=browser_max_memory,
+        concurrency=concurrency,
+        workers=workers,
+        adaptive_settle=adaptive_settle,
+        block_resources=block_resources,
+        har_mode=har_mode,
+        har_dir=har_dir,
+        screenshot_format=screenshot_format,
+        screenshot_quality=screenshot_quality
     )
 
     await run_experiment(task_range, experiment_config)
@@ -238,6 +468,55 @@ if __name__ == "__main__":
                         default="gemini-1.5-flash-002")
     parser.add_argument("--global_reward_text_model", type=str,
                         default="gemini-1.5-flash-002")
+    parser.add_argument("--observation_backend", choices=["lxml", "js", "cdp_snapshot"], default="lxml",
+                        help="lxml parses page.content(), js extracts candidate elements in the browser, "
+                             "cdp_snapshot prunes with layout from DOMSnapshot.captureSnapshot.")
+    parser.add_argument("--incremental_observation", action="store_true",
+                        help="Reuse unchanged parts of the previous observation and keep element numbers stable.")
+    parser.add_argument("--paged_observation", action="store_true",
+                        help="Observe one viewport of the page at a time, needs --observation_backend cdp_snapshot.")
+    parser.add_argument("--compress_observation", action="store_true",
+                        help="Collapse repeated sibling elements into groups the planner can expand.")
+    parser.add_argument("--html_parser", type=str, default="lxml", choices=["lxml", "lxml_bytes", "html5"],
+                        help="Parser of the lxml observation backend. html5 is experimental: it needs the "
+                             "html5-parser package, is slower than lxml and adds tbody to tables, "
+                             "so its observations differ from lxml.")
+    parser.add_argument("--observe_frames", action="store_true",
+                        help="Extract iframes concurrently and merge them into the observation, lxml and js backends.")
+    parser.add_argument("--element_rules", type=str, default="",
+                        help="TOML file of site rules for labelling interactive elements, "
+                             "see configs/element_rules.example.toml.")
+    parser.add_argument("--element_handles", action="store_true",
+                        help="Stamp page elements with data-wc-id handles while observing and target actions by handle.")
+    parser.add_argument("--browser_pool", type=int, default=0,
+                        help="Keep this many browsers warm and give each task a new context in one of them, "
+                             "0 launches a browser per task.")
+    parser.add_argument("--browser_max_tasks", type=int, default=50,
+                        help="Tasks a pooled browser serves before it is launched again.")
+    parser.add_argument("--browser_max_memory", type=int, default=0,
+                        help="MB of memory above which a pooled browser is launched again, needs psutil. "
+                             "0 disables the check.")
+    parser.add_argument("--concurrency", type=int, default=1,
+                        help="Number of tasks run at once, each in its own browser context.")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of processes the tasks are sharded across, "
+                             "each runs --concurrency tasks at once with its own browsers.")
+    parser.add_argument("--adaptive_settle", action="store_true",
+                        help="After actions wait until the page is loaded and quiet instead of fixed times, "
+                             "which become upper bounds, and drop slow_mo.")
+    parser.add_argument("--block_resources", choices=["auto", "on", "off"], default="auto",
+                        help="Abort image, media and font requests and tracker hosts. "
+                             "auto blocks in dom mode without a vision reward, which need screenshots.")
+    parser.add_argument("--har_mode", choices=["off", "record", "replay"], default="off",
+                        help="record writes the network traffic of each task to a HAR in --har_dir, "
+                             "replay serves each task from its HAR without network access.")
+    parser.add_argument("--har_dir", type=str, default="har",
+                        help="Directory of the HAR files of --har_mode, one task_index_id.har per task.")
+    parser.add_argument("--screenshot_format", choices=["jpeg", "webp", "png"], default="jpeg",
+                        help="Format the browser encodes screenshots in, they go to the model "
+                             "and to results/screenshots as encoded.")
+    parser.add_argument("--screenshot_quality", type=int, default=90,
+                        help="Quality of jpeg and webp screenshots, 0 to 100.")
 
     args = parser.parse_args()
 
@@ -246,4 +525,23 @@ if __name__ == "__main__":
                      global_reward_text_model=args.global_reward_text_model,
                      single_task_name=args.single_task_name,
                      raw_data_index=args.index,
-                     observation_mode=args.mode))
+                     observation_mode=args.mode,
+                     observation_backend=args.observation_backend,
+                     incremental_observation=args.incremental_observation,
+                     paged_observation=args.paged_observation,
+                     compress_observation=args.compress_observation,
+                     html_parser=args.html_parser,
+                     observe_frames=args.observe_frames,
+                     element_rules=args.element_rules,
+                     element_handles=args.element_handles,
+                     browser_pool=args.browser_pool,
+                     browser_max_tasks=args.browser_max_tasks,
+                     browser_max_memory=args.browser_max_memory,
+                     concurrency=args.concurrency,
+                     workers=args.workers,
+                     adaptive_settle=args.adaptive_settle,
+                     block_resources=args.block_resources,
+                     har_mode=args.har_mode,
+                     har_dir=args.har_dir,
+                     screenshot_format=args.screenshot_format,
+                     screenshot_quality=args.screenshot_quality))
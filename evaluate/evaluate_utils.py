@@ -1,12 +1,14 @@
 from urllib.parse import urlparse
 
 from playwright.async_api import Page
+import asyncio
 import re
 import toml
 import json
 import json5
 import traceback
 import os
+from contextlib import nullcontext
 from typing import List
 
 from agent.Environment.html_env.async_env import AsyncHTMLEnvironment, ActionExecutionError
@@ -19,6 +21,9 @@ from evaluate import (ElementEvaluator, FinishTaskEvaluator,
                       TaskLengthEvaluator, TextEvaluator, URLEvaluator)
 from logs import logger
 
+# Lock shared by the --workers processes, which all update one token count file
+token_file_lock = None
+
 
 def read_file(file_path: str = "./data/example/example_130.json") -> List[List]:
     """Read labeled data
@@ -351,7 +356,8 @@ def parse_current_trace(response: dict, env: AsyncHTMLEnvironment, step_reward:
         element_id = 0
     if action_type in ["fill_form", "fill_search", "click", "select_option"]:
         try:
-            selector = env.tree.get_selector_and_xpath(
+            # Elements inside frames get frame-qualified locators, which never match the page
+            selector = env.tree.get_frame_selector_and_xpath(
                 env.tree.nodeDict[element_id])
             element_value = env.tree.get_element_value(
                 env.tree.nodeDict[element_id])
@@ -362,6 +368,13 @@ def parse_current_trace(response: dict, env: AsyncHTMLEnvironment, step_reward:
                 "Failed to obtain element_id from the accessibility tree.")
             element_id = 0
             action_type = "None"
+    elif action_type == "expand":
+        # Expanding a group only changes the observation, no selector is recorded for the evaluators
+        if element_id not in env.tree.nodeDict:
+            logger.info(
+                "Failed to obtain element_id from the accessibility tree.")
+            element_id = 0
+            action_type = "None"
     elif action_type in ["get_final_answer", "cache_data"]:
         selector = None
         element_id = 0
@@ -510,7 +523,8 @@ async def run_task(
                     feedback=error_description,
                     mode=mode,
                     observation_VforD=observation_VforD,
-                    status_description=status_description
+                    status_description=status_description,
+                    compress_observation=env.compress_observation
                 )
 
                 if out_put is not None:
@@ -607,15 +621,17 @@ async def run_task(
                     f"ActionExecutionError occurred: {error_message}")
                 error_description = error_message
 
+            observation_VforD = None
             if mode in ["d_v", "dom_v_desc", "vision_to_dom"]:
-                observation, observation_VforD = await env.get_obs()
+                observation, observation_VforD = await env.get_obs(task=task_name)
                 if observation_VforD:
-                    save_screenshot(mode=mode, record_time=record_time,
-                                    task_name=task_name, step_number=num_steps,
-                                    description="obs",
-                                    screenshot_base64=observation_VforD)
+                    await asyncio.to_thread(save_screenshot, mode=mode, record_time=record_time,
+                                            task_name=task_name, step_number=num_steps,
+                                            description="obs",
+                                            screenshot_base64=observation_VforD)
             else:
-                observation = await env.get_obs()
+                observation = await env.get_obs(task=task_name)
+            each_step_dict["observation_stats"] = env.last_observation_stats
 
             # URL after executing the action
             each_step_dict["step_url"] = env.page.url
@@ -628,12 +644,13 @@ async def run_task(
 
             if "vision" in global_reward_mode:
                 try:
-                    vision_reward = await env.capture()
-                    save_screenshot(mode=mode, record_time=record_time,
-                                    task_name=task_name, step_number=num_steps,
-                                    description="reward",
-                                    screenshot_base64=vision_reward,
-                                    task_name_id=task_uuid)
+                    # The observation screenshot of this step shows the same page
+                    vision_reward = observation_VforD or await env.capture()
+                    await asyncio.to_thread(save_screenshot, mode=mode, record_time=record_time,
+                                            task_name=task_name, step_number=num_steps,
+                                            description="reward",
+                                            screenshot_base64=vision_reward,
+                                            task_name_id=task_uuid)
                 except ValueError:
                     vision_reward = ''
                 is_valid, message = is_valid_base64(vision_reward)
@@ -700,8 +717,9 @@ async def run_task(
     step_tokens["steps_token_counts"] = steps_token_counts
 
     # Update token counting
-    save_token_count_to_file(token_counts_filename, step_tokens, task_name, global_reward_text_model,
-                             planning_text_model, config["token_pricing"])
+    with token_file_lock or nullcontext():
+        save_token_count_to_file(token_counts_filename, step_tokens, task_name, global_reward_text_model,
+                                 planning_text_model, config["token_pricing"])
 
     # ! 3. Task evaluation and scoring
     if task_mode == "batch_tasks":
@@ -739,11 +757,12 @@ async def run_task(
         task_result["LLM_error_rate"] = str(
             response_error_count / response_total_count)
         task_result["step_list"] = steps_list
+        if env.request_blocker is not None:
+            task_result["request_blocking"] = env.request_blocker.stats()
         task_result["evaluate_steps"] = reference_evaluate_steps
 
         json_result_folder = write_result_file_path
-        if not os.path.exists(json_result_folder):
-            os.makedirs(json_result_folder)
+        os.makedirs(json_result_folder, exist_ok=True)
         json_out_file_path = os.path.join(
             json_result_folder, str(task_index) + "_" + str(task_result["id"]) + ".json")
         logger.info(f"Write results to json file: {json_out_file_path}")